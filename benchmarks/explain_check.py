@@ -0,0 +1,116 @@
+"""Check that the hot routes' queries are served by indexes.
+
+Requests each hot route once against a Postgres database holding a
+benchmark dataset, EXPLAINs every SELECT the request ran, prints the
+findings as JSON and exits with status 1 if any plan sequentially scans
+one of the big tables. Load the dataset with benchmarks.routes first:
+
+    python -m benchmarks.routes --dataset medium --requests 1 \\
+        --database-url postgresql:///warbler-bench > /dev/null
+    python -m benchmarks.explain_check --database-url postgresql:///warbler-bench
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from benchmarks.routes import BENCH_USERNAME
+
+# Tables big enough that scanning them whole means a missing index.
+BIG_TABLES = {'users', 'messages', 'follows', 'likes', 'timelines',
+              'recommendations'}
+
+
+def seq_scans(plan):
+    """Big tables sequentially scanned by `plan`, a node of EXPLAIN's JSON
+    output, or any node under it."""
+
+    found = []
+    if (plan['Node Type'] == 'Seq Scan'
+            and plan.get('Relation Name') in BIG_TABLES):
+        found.append(plan['Relation Name'])
+
+    for child in plan.get('Plans', []):
+        found.extend(seq_scans(child))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', required=True,
+                        help="Postgres database with a benchmark dataset")
+    args = parser.parse_args()
+
+    # app reads its configuration from the environment when imported.
+    os.environ['DATABASE_URL'] = args.database_url
+    os.environ.setdefault('SQL_PROFILER_SAMPLE_RATE', '0')
+
+    from app import app, CURR_USER_KEY
+    from models import db, Message, User
+
+    app.config['DEBUG_TB_ENABLED'] = False
+
+    if db.engine.dialect.name != 'postgresql':
+        parser.error("EXPLAIN plans are only checked on Postgres")
+
+    bench_user = User.query.filter_by(username=BENCH_USERNAME).one()
+    message = Message.query.order_by(Message.id.desc()).first()
+
+    # (path, whether to log in as the benchmark user)
+    routes = [
+        ('/', True),
+        ('/api/timeline', True),
+        (f'/users/{bench_user.id}', False),
+        ('/users/1', False),
+        ('/users/1/followers', True),
+        (f'/users/{bench_user.id}/following', True),
+        ('/users', False),
+        ('/users?q=an', False),
+        ('/users?q=anna', False),
+        (f'/messages/{message.id}', False),
+        ('/users/suggestions', True),
+    ]
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    results = {}
+    for path, login in routes:
+        client = app.test_client()
+        if login:
+            with client.session_transaction() as sess:
+                sess[CURR_USER_KEY] = bench_user.id
+
+        statements.clear()
+        event.listen(Engine, 'before_cursor_execute', capture)
+        try:
+            status = client.get(path).status_code
+        finally:
+            event.remove(Engine, 'before_cursor_execute', capture)
+
+        scans = []
+        with db.engine.connect() as conn:
+            for statement, parameters in statements:
+                explained = conn.exec_driver_sql(
+                    f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+                for table in seq_scans(explained[0]['Plan']):
+                    scans.append({'table': table, 'statement': statement})
+
+        results[path] = {'status': status, 'queries': len(statements),
+                         'seq_scans': scans}
+
+    print(json.dumps(results, indent=2))
+
+    if any(result['seq_scans'] for result in results.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
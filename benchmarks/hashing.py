@@ -0,0 +1,67 @@
+"""Benchmark login throughput with inline vs pooled bcrypt.
+
+Simulates concurrent logins (password checks) from a pool of request
+threads, first hashing inline on those threads and then through the
+PasswordHasher process pool, and prints logins/sec overall and per core.
+
+Run from the project root like:
+
+    python -m benchmarks.hashing --rounds 12 --threads 16 --logins 200
+"""
+
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from hashing import PasswordHasher
+
+PASSWORD = "password"
+
+
+def run(hasher, hashed, threads, logins):
+    """Check `logins` passwords from `threads` threads; return logins/sec."""
+
+    start = perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as request_threads:
+        results = list(request_threads.map(
+            lambda _: hasher.check(hashed, PASSWORD), range(logins)))
+    elapsed = perf_counter() - start
+
+    assert all(results)
+    return logins / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=12)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    inline = PasswordHasher(rounds=args.rounds, workers=0)
+    pooled = PasswordHasher(rounds=args.rounds, workers=args.workers,
+                            max_pending=args.threads, timeout=60)
+    hashed = inline.hash(PASSWORD)
+
+    # Start the worker processes before timing.
+    pooled.check(hashed, PASSWORD)
+
+    results = {}
+    for name, hasher, cores in [('inline', inline, 1),
+                                ('pooled', pooled, args.workers)]:
+        per_sec = run(hasher, hashed, args.threads, args.logins)
+        results[name] = {
+            'logins_per_sec': round(per_sec, 2),
+            'cores': cores,
+            'logins_per_sec_per_core': round(per_sec / cores, 2),
+        }
+
+    pooled.shutdown()
+    print(json.dumps({'rounds': args.rounds, **results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Benchmark refreshing "who to follow" suggestions.
+
+Builds a random follow graph in memory (no database), then times loading
+it into a FollowGraph and computing every user's top-K suggestions, and
+reports the graph's size and the process's peak memory.
+
+Run from the project root like:
+
+    python -m benchmarks.recommendations --users 1000000 --follows 100000000
+
+The default 1M users / 100M follows needs several GB of RAM.
+"""
+
+import argparse
+import json
+import resource
+from time import perf_counter
+
+import numpy as np
+
+from recommendations import BLOCK_PATHS, TOP_K, FollowGraph, top_suggestions
+
+
+def random_follows(users, follows, seed):
+    """`follows` random (follower, followed) id arrays, without self-follows.
+    (Repeated pairs are possible, and just count twice.)"""
+
+    rng = np.random.default_rng(seed)
+    followers = rng.integers(1, users + 1, follows, dtype=np.int32)
+    # Shift by 1 .. users - 1 so nobody follows themselves.
+    offsets = rng.integers(1, users, follows, dtype=np.int32)
+    followed = ((followers - 1 + offsets) % users + 1).astype(np.int32)
+    return followers, followed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=1_000_000)
+    parser.add_argument('--follows', type=int, default=100_000_000)
+    parser.add_argument('--k', type=int, default=TOP_K)
+    parser.add_argument('--max-paths', type=int, default=BLOCK_PATHS)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    followers, followed = random_follows(args.users, args.follows, args.seed)
+
+    start = perf_counter()
+    graph = FollowGraph.from_edges(followers, followed, args.users + 1)
+    built = perf_counter()
+    del followers, followed
+
+    suggestions = 0
+    for user_ids, _, _, _ in top_suggestions(graph, args.k, args.max_paths):
+        suggestions += len(user_ids)
+    computed = perf_counter()
+
+    print(json.dumps({
+        'users': args.users,
+        'follows': graph.num_follows,
+        'k': args.k,
+        'graph_mb': round(graph.nbytes / 2**20, 1),
+        'build_seconds': round(built - start, 2),
+        'compute_seconds': round(computed - built, 2),
+        'suggestions': suggestions,
+        # ru_maxrss is in KB on Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
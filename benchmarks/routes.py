@@ -0,0 +1,225 @@
+"""Load and latency benchmark for Warbler's main routes.
+
+Loads a generated dataset of the chosen size into a local database, then
+drives each route through Flask test clients on a pool of threads and
+prints JSON with throughput, p50/p95/p99 latency and SQL statements per
+request for every route, so runs can be compared between commits.
+Everything runs offline, against SQLite (the default) or a local Postgres.
+
+Run from the project root like:
+
+    python -m benchmarks.routes --dataset medium --profile celebrity \\
+        --database-url postgresql:///warbler-bench --concurrency 8 > before.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from random import Random
+from time import perf_counter
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DATASETS = {
+    'small': dict(users=300, messages=1_000, follows=5_000),
+    'medium': dict(users=10_000, messages=100_000, follows=200_000),
+    'large': dict(users=100_000, messages=1_000_000, follows=2_000_000),
+}
+
+BENCH_USERNAME = 'benchmark'
+BENCH_PASSWORD = 'benchmark-password'
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+
+    if not sorted_values:
+        return None
+    index = min(int(fraction * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+class QueryCounter:
+    """Counts SQL statements per thread, via SQLAlchemy engine events."""
+
+    def __init__(self):
+        self.local = threading.local()
+        event.listen(Engine, 'before_cursor_execute', self.count)
+
+    def count(self, *args):
+        self.local.count = getattr(self.local, 'count', 0) + 1
+
+    def reset(self):
+        self.local.count = 0
+
+    @property
+    def value(self):
+        return getattr(self.local, 'count', 0)
+
+
+def load_dataset(args):
+    """Generate (unless --data-dir is given) and load the CSVs; then add a
+    benchmark user who follows a sample of accounts."""
+
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'generator'))
+    from create_csvs import generate
+    from models import db, User, Follows, TimelineEntry
+    from seed import seed
+
+    data_dir = args.data_dir
+    if not data_dir:
+        data_dir = tempfile.mkdtemp(prefix='warbler-bench-')
+        generate(out=data_dir, seed=args.seed, profile=args.profile,
+                 **DATASETS[args.dataset])
+
+    seed(data_dir, progress=lambda *args: None)
+
+    user = User.signup(username=BENCH_USERNAME, email='benchmark@example.com',
+                       password=BENCH_PASSWORD, image_url=None)
+    db.session.flush()
+
+    num_users = User.query.count()
+    for followed_id in Random(args.seed).sample(range(1, num_users), min(100, num_users - 1)):
+        db.session.add(Follows(user_being_followed_id=followed_id,
+                               user_following_id=user.id))
+    db.session.flush()
+
+    TimelineEntry.rebuild()
+    User.reconcile_counts()
+    db.session.commit()
+
+
+def run_route(app, counter, name, request, total, concurrency, login_as):
+    """Make `total` requests (built by `request(rng, client)`) from
+    `concurrency` threads; return stats for the route."""
+
+    from app import CURR_USER_KEY
+
+    local = threading.local()
+    thread_numbers = count()
+    latencies = []
+    queries = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def one(i):
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+            with lock:
+                local.rng = Random(f"{name}-{next(thread_numbers)}")
+            if login_as:
+                with local.client.session_transaction() as sess:
+                    sess[CURR_USER_KEY] = login_as
+
+        counter.reset()
+        start = perf_counter()
+        response = request(local.rng, local.client)
+        elapsed = perf_counter() - start
+
+        with lock:
+            latencies.append(elapsed * 1000)
+            queries.append(counter.value)
+            if response.status_code >= 400:
+                errors[0] += 1
+
+    start = perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall = perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': total,
+        'errors': errors[0],
+        'throughput_rps': round(total / wall, 2),
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'mean_queries': round(sum(queries) / len(queries), 2),
+        'max_queries': max(queries),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dataset', choices=sorted(DATASETS), default='small')
+    parser.add_argument('--profile', default='uniform',
+                        help="generator dataset profile (see generator/profiles.py)")
+    parser.add_argument('--data-dir',
+                        help="load existing CSVs from here instead of generating")
+    parser.add_argument('--skip-load', action='store_true',
+                        help="reuse the data already in the database")
+    parser.add_argument('--database-url', default='sqlite:///' + os.path.join(
+        tempfile.gettempdir(), 'warbler-bench.db'))
+    parser.add_argument('--requests', type=int, default=500,
+                        help="requests per route")
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    # app reads its configuration from the environment when imported.
+    os.environ['DATABASE_URL'] = args.database_url
+    os.environ.setdefault('SQL_PROFILER_SAMPLE_RATE', '0')
+
+    from app import app
+    from models import User
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.config['DEBUG_TB_ENABLED'] = False
+
+    if not args.skip_load:
+        load_dataset(args)
+
+    bench_user = User.query.filter_by(username=BENCH_USERNAME).one()
+    num_users = User.query.count()
+    counter = QueryCounter()
+
+    def random_user(rng):
+        return rng.randint(1, num_users)
+
+    routes = [
+        ('GET /', bench_user.id,
+         lambda rng, c: c.get('/')),
+        ('GET /users', None,
+         lambda rng, c: c.get('/users')),
+        ('GET /users?q=', None,
+         lambda rng, c: c.get('/users', query_string={'q': 'an'})),
+        ('GET /users/<id>', None,
+         lambda rng, c: c.get(f'/users/{random_user(rng)}')),
+        ('GET /users/<id>/followers', bench_user.id,
+         lambda rng, c: c.get(f'/users/{random_user(rng)}/followers')),
+        ('GET /users/1/followers', bench_user.id,
+         lambda rng, c: c.get('/users/1/followers')),
+        ('POST /login', None,
+         lambda rng, c: c.post('/login', data={'username': BENCH_USERNAME,
+                                               'password': BENCH_PASSWORD})),
+        ('GET /messages/new', bench_user.id,
+         lambda rng, c: c.get('/messages/new')),
+        ('POST /messages/new', bench_user.id,
+         lambda rng, c: c.post('/messages/new', data={'text': 'Benchmark warble'})),
+    ]
+
+    results = {
+        name: run_route(app, counter, name, request, args.requests,
+                        args.concurrency, login_as)
+        for name, login_as, request in routes
+    }
+
+    print(json.dumps({
+        'dataset': args.data_dir or args.dataset,
+        'profile': args.profile,
+        'database': User.query.session.get_bind().dialect.name,
+        'users': num_users,
+        'concurrency': args.concurrency,
+        'routes': results,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""Bulk loading of Warbler's CSV data (see generator/).
+
+On Postgres the CSVs are streamed in with COPY ... FROM STDIN, a chunk
+at a time, with the tables' indexes and foreign keys dropped during the
+load and rebuilt afterwards. Other databases (SQLite for local testing)
+get batched executemany INSERTs instead.
+
+The derived data (timelines, counters) isn't touched here; see seed.py.
+"""
+
+import csv
+import io
+import os
+import sys
+from datetime import datetime
+from itertools import islice
+from time import perf_counter
+
+from sqlalchemy import DateTime, Integer, text
+from sqlalchemy.schema import AddConstraint, CreateIndex, DropConstraint, DropIndex
+
+import migrations
+from models import db, User, Message, Follows, USER_SEARCH_INDEXES
+
+# In dependency order, since the executemany path keeps foreign keys on.
+CSV_TABLES = [
+    ('users.csv', User.__table__),
+    ('messages.csv', Message.__table__),
+    ('follows.csv', Follows.__table__),
+]
+
+
+def print_progress(table, rows, elapsed):
+    """Default progress report: running row count and rate on stderr."""
+
+    rate = rows / elapsed if elapsed else 0
+    print(f"{table}: {rows:,} rows ({rate:,.0f} rows/sec)", file=sys.stderr)
+
+
+def load_csvs(engine=None, directory='generator', chunk_rows=50_000,
+              reset=True, progress=print_progress):
+    """Load users.csv, messages.csv and follows.csv from `directory`.
+
+    With `reset`, all tables are dropped and the schema is created afresh
+    by migrations.migrate first. `progress`
+    is called as progress(table_name, rows_so_far, seconds) after each
+    chunk of `chunk_rows` rows.
+    """
+
+    engine = engine or db.engine
+    tables = [(os.path.join(directory, filename), table)
+              for filename, table in CSV_TABLES]
+
+    if reset:
+        migrations.reset(engine)
+        migrations.migrate(engine)
+
+    if engine.dialect.name == 'postgresql':
+        load_with_copy(engine, tables, chunk_rows, progress)
+    else:
+        load_with_executemany(engine, tables, chunk_rows, progress)
+
+
+def deferred_ddl(tables):
+    """(drop, create) pairs for the foreign keys and secondary indexes of
+    `tables`, which are cheaper to build once after a bulk load."""
+
+    for table in tables:
+        for constraint in table.foreign_key_constraints:
+            yield DropConstraint(constraint), AddConstraint(constraint)
+        for index in table.indexes:
+            yield DropIndex(index), CreateIndex(index)
+
+        if table is User.__table__:
+            for name, ddl in USER_SEARCH_INDEXES.items():
+                yield text(f"DROP INDEX IF EXISTS {name}"), text(ddl)
+
+
+def csv_chunks(reader, chunk_rows):
+    """Re-serialize `reader`'s rows into CSV buffers of `chunk_rows` rows;
+    yields (buffer, row_count)."""
+
+    while True:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        count = 0
+
+        for row in islice(reader, chunk_rows):
+            writer.writerow(row)
+            count += 1
+
+        if not count:
+            return
+
+        buffer.seek(0)
+        yield buffer, count
+
+
+def load_with_copy(engine, tables, chunk_rows, progress):
+    """Postgres: COPY each CSV in, with FKs and indexes deferred."""
+
+    quote = engine.dialect.identifier_preparer.quote
+    deferred = list(deferred_ddl([table for _, table in tables]))
+
+    with engine.begin() as conn:
+        for drop, _ in deferred:
+            conn.execute(drop)
+
+        cursor = conn.connection.cursor()
+
+        for path, table in tables:
+            with open(path, newline='') as f:
+                reader = csv.reader(f)
+                columns = ', '.join(quote(table.c[name].name)
+                                    for name in next(reader))
+                copy = (f"COPY {quote(table.name)} ({columns}) "
+                        f"FROM STDIN WITH (FORMAT csv)")
+
+                rows = 0
+                start = perf_counter()
+                for buffer, count in csv_chunks(reader, chunk_rows):
+                    cursor.copy_expert(copy, buffer)
+                    rows += count
+                    progress(table.name, rows, perf_counter() - start)
+
+        for _, create in deferred:
+            conn.execute(create)
+
+        # COPY'd ids don't advance serial sequences; point them past the data.
+        for _, table in tables:
+            if 'id' in table.c and table.c.id.autoincrement:
+                conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                    f"COALESCE((SELECT MAX(id) FROM {quote(table.name)}), 0) + 1, "
+                    f"false)"))
+
+
+def converter(column_type):
+    """Function turning a CSV string into a value for `column_type`."""
+
+    if isinstance(column_type, DateTime):
+        return lambda value: datetime.fromisoformat(value) if value else None
+    if isinstance(column_type, Integer):
+        return lambda value: int(value) if value else None
+    return lambda value: value
+
+
+def load_with_executemany(engine, tables, chunk_rows, progress):
+    """Other databases: INSERT each CSV in batches of `chunk_rows` rows."""
+
+    with engine.begin() as conn:
+        for path, table in tables:
+            with open(path, newline='') as f:
+                reader = csv.DictReader(f)
+                convert = {name: converter(table.c[name].type)
+                           for name in reader.fieldnames}
+
+                rows = 0
+                start = perf_counter()
+                while True:
+                    batch = [{name: convert[name](value)
+                              for name, value in row.items()}
+                             for row in islice(reader, chunk_rows)]
+                    if not batch:
+                        break
+
+                    conn.execute(table.insert(), batch)
+                    rows += len(batch)
+                    progress(table.name, rows, perf_counter() - start)
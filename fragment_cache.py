@@ -0,0 +1,97 @@
+"""Cache of rendered message HTML for Warbler timelines.
+
+A warble's HTML only changes if its author changes their username or
+picture, or the template changes, so timelines reuse each message's
+rendered fragment instead of re-running the template for it.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+
+
+class FragmentCache:
+    """Thread-safe LRU cache of rendered message fragments, holding at
+    most `max_bytes` of (UTF-8) HTML.
+
+    Entries are tracked by message and by author so they can be dropped
+    when a message is deleted or its author edits their profile.
+    """
+
+    def __init__(self, max_bytes=16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._by_message = {}
+        self._by_author = {}
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_render(self, key, message_id, author_id, render):
+        """HTML cached under `key`, or `render()`ed and cached on a miss."""
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        html = render()
+        size = len(html.encode('UTF-8'))
+        if size > self.max_bytes:
+            return html
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (html, size, message_id, author_id)
+                self._by_message.setdefault(message_id, set()).add(key)
+                self._by_author.setdefault(author_id, set()).add(key)
+                self.bytes += size
+                while self.bytes > self.max_bytes:
+                    self._remove(next(iter(self._entries)))
+                    self.evictions += 1
+
+        return html
+
+    def _remove(self, key):
+        html, size, message_id, author_id = self._entries.pop(key)
+        self.bytes -= size
+        for index, id in [(self._by_message, message_id),
+                          (self._by_author, author_id)]:
+            keys = index[id]
+            keys.discard(key)
+            if not keys:
+                del index[id]
+
+    def invalidate_message(self, message_id):
+        """Drop the fragments of a message, e.g. when it is deleted."""
+
+        with self._lock:
+            for key in list(self._by_message.get(message_id, ())):
+                self._remove(key)
+
+    def invalidate_author(self, author_id):
+        """Drop the fragments of every message by an author, e.g. when
+        they edit their profile."""
+
+        with self._lock:
+            for key in list(self._by_author.get(author_id, ())):
+                self._remove(key)
+
+    def stats(self):
+        """Hit ratio and memory held, for sizing the cache."""
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / lookups if lookups else None,
+            }
@@ -3,14 +3,31 @@
 Students won't need to run this for the exercise; they will just use the CSV
 files that this generates. You should only need to run this if you wanted to
 tweak the CSV formats or generate fewer/more rows.
+
+Rows are generated in shards across a process pool, each shard with its own
+deterministic seed, streamed to a part file and then concatenated, so the
+same arguments always give the same CSVs and nothing is held in memory
+beyond one shard. No network access is needed.
+
+    python generator/create_csvs.py --users 1000000 --messages 10000000 \\
+        --follows 20000000 --workers 8 --out /tmp/warbler-data
+
+Pass --profile to get a skewed, production-like graph (see profiles.py).
 """
 
+import argparse
 import csv
-from random import choice, randint, sample
-from itertools import permutations
-import requests
+import os
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from random import Random
+
+import numpy as np
 from faker import Faker
-from helpers import get_random_datetime
+from helpers import get_random_datetimes
+from profiles import PROFILES, follower_counts, spread, zipf_rank
 
 MAX_WARBLER_LENGTH = 140
 
@@ -22,56 +39,276 @@ NUM_USERS = 300
 NUM_MESSAGES = 1000
 NUM_FOLLWERS = 5000
 
-fake = Faker()
+SHARD_ROWS = 250_000
 
-# Generate random profile image URLs to use for users
+# bcrypt hash of "password"
+PASSWORD_HASH = '$2b$12$Q1PUFjhN/AWRQ21LbGYvjeLpZZB6lfZ1BPwifHALGO6oIbyC3CmJe'
 
-image_urls = [
+# Random profile image URLs to use for users
+
+IMAGE_URLS = [
     f"https://randomuser.me/api/portraits/{kind}/{i}.jpg"
     for kind, count in [("lego", 10), ("men", 100), ("women", 100)]
     for i in range(count)
 ]
 
-# Generate random header image URLs to use for users
+# Header images bundled with the app
 
-header_image_urls = [
-    requests.get(f"http://www.splashbase.co/api/v1/images/{i}").json()['url']
-    for i in range(1, 46)
+HEADER_IMAGE_URLS = [
+    "/static/images/warbler-hero.jpg",
+    "/static/images/signed-out-home.jpg",
 ]
 
-with open('generator/users.csv', 'w') as users_csv:
-    users_writer = csv.DictWriter(users_csv, fieldnames=USERS_CSV_HEADERS)
-    users_writer.writeheader()
-
-    for i in range(NUM_USERS):
-        users_writer.writerow(dict(
-            email=fake.email(),
-            username=fake.user_name(),
-            image_url=choice(image_urls),
-            password='$2b$12$Q1PUFjhN/AWRQ21LbGYvjeLpZZB6lfZ1BPwifHALGO6oIbyC3CmJe',
-            bio=fake.sentence(),
-            header_image_url=choice(header_image_urls),
-            location=fake.city()
-        ))
-
-with open('generator/messages.csv', 'w') as messages_csv:
-    messages_writer = csv.DictWriter(messages_csv, fieldnames=MESSAGES_CSV_HEADERS)
-    messages_writer.writeheader()
-
-    for i in range(NUM_MESSAGES):
-        messages_writer.writerow(dict(
-            text=fake.paragraph()[:MAX_WARBLER_LENGTH],
-            timestamp=get_random_datetime(),
-            user_id=randint(1, NUM_USERS)
-        ))
-
-# Generate follows.csv from random pairings of users
-
-with open('generator/follows.csv', 'w') as follows_csv:
-    all_pairs = list(permutations(range(1, NUM_USERS + 1), 2))
-
-    users_writer = csv.DictWriter(follows_csv, fieldnames=FOLLOWS_CSV_HEADERS)
-    users_writer.writeheader()
-
-    for followed_user, follower in sample(all_pairs, NUM_FOLLWERS):
-        users_writer.writerow(dict(user_being_followed_id=followed_user, user_following_id=follower))
+
+class Vocabulary:
+    """Word, name and city pools drawn once from Faker, so rows can be
+    built with cheap random choices instead of a Faker call per field."""
+
+    def __init__(self, seed):
+        fake = Faker()
+        fake.seed_instance(seed)
+        self.words = sorted(set(fake.words(nb=5000)))
+        self.names = sorted({fake.user_name() for _ in range(2000)})
+        self.cities = sorted({fake.city() for _ in range(500)})
+
+    def sentence(self, rng, min_words, max_words):
+        words = rng.choices(self.words, k=rng.randint(min_words, max_words))
+        return " ".join(words).capitalize() + "."
+
+
+def shard_seed(seed, kind, shard):
+    """Deterministic seed for one shard of one CSV."""
+
+    return f"{seed}-{kind}-{shard}"
+
+
+def split(total, shards):
+    """Split `total` rows into `shards` near-equal counts."""
+
+    return [total // shards + (1 if i < total % shards else 0)
+            for i in range(shards)]
+
+
+def write_users(path, seed, shard, first_id, count):
+    """Users `first_id` .. `first_id + count - 1`; ids go into the
+    username and email to keep them unique."""
+
+    rng = Random(shard_seed(seed, 'users', shard))
+    vocabulary = Vocabulary(seed)
+
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        for user_id in range(first_id, first_id + count):
+            username = f"{rng.choice(vocabulary.names)}{user_id}"
+            writer.writerow([
+                f"{username}@example.com",
+                username,
+                rng.choice(IMAGE_URLS),
+                PASSWORD_HASH,
+                vocabulary.sentence(rng, 4, 10),
+                rng.choice(HEADER_IMAGE_URLS),
+                rng.choice(vocabulary.cities),
+            ])
+
+
+def write_messages(path, seed, shard, count, num_users, now, profile):
+    """`count` messages at random times before `now`, with authors and
+    bursts as described by `profile`."""
+
+    rng = Random(shard_seed(seed, 'messages', shard))
+    vocabulary = Vocabulary(seed)
+    timestamps = get_random_datetimes(
+        count, now=now, rng=np.random.default_rng(rng.getrandbits(64)))
+
+    def author():
+        if profile.author_skew is None:
+            return rng.randint(1, num_users)
+        return spread(zipf_rank(rng.random(), num_users, profile.author_skew),
+                      num_users)
+
+    # Chance each step starts a burst, so that about burst_fraction of all
+    # messages end up in one.
+    size = profile.burst_size
+    start_burst = (profile.burst_fraction
+                   / (size * (1 - profile.burst_fraction) + profile.burst_fraction))
+    burst_seconds = profile.burst_minutes * 60
+
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        written = 0
+        while written < count:
+            timestamp = timestamps[written]
+            if rng.random() < start_burst:
+                user_id = author()
+                burst = [(timestamp - timedelta(seconds=rng.uniform(0, burst_seconds)),
+                          user_id)
+                         for _ in range(min(size, count - written))]
+            else:
+                burst = [(timestamp, author())]
+
+            for timestamp, user_id in burst:
+                writer.writerow([
+                    vocabulary.sentence(rng, 3, 20)[:MAX_WARBLER_LENGTH],
+                    timestamp,
+                    user_id,
+                ])
+            written += len(burst)
+
+
+def write_follows(path, seed, shard, first_pair, last_pair, count, num_users):
+    """`count` distinct follows picked from pairs numbered
+    [first_pair, last_pair).
+
+    Pair k is user k // (N - 1) + 1 being followed by the k % (N - 1)'th
+    other user, so sampling distinct pair numbers gives distinct follows
+    without ever listing all N * (N - 1) pairs.
+    """
+
+    rng = Random(shard_seed(seed, 'follows', shard))
+    others = num_users - 1
+
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        for pair in sorted(rng.sample(range(first_pair, last_pair), count)):
+            followed = pair // others + 1
+            follower = pair % others + 1
+            if follower >= followed:
+                follower += 1
+            writer.writerow([followed, follower])
+
+
+def write_skewed_follows(path, seed, shard, first_id, counts, num_users):
+    """Followers for users `first_id` onwards, `counts[i]` distinct random
+    followers for user `first_id + i`."""
+
+    rng = Random(shard_seed(seed, 'follows', shard))
+
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        for followed, count in enumerate(counts, start=first_id):
+            for follower in sorted(rng.sample(range(1, num_users), count)):
+                if follower >= followed:
+                    follower += 1
+                writer.writerow([followed, follower])
+
+
+def concatenate(path, headers, parts):
+    """Write `headers` and then each part file, in order, to `path`."""
+
+    with open(path, 'w', newline='') as out:
+        csv.writer(out).writerow(headers)
+        for part in parts:
+            with open(part, newline='') as f:
+                shutil.copyfileobj(f, out)
+            os.remove(part)
+
+
+def generate(out='generator', users=NUM_USERS, messages=NUM_MESSAGES,
+             follows=NUM_FOLLWERS, seed=0, workers=None, shard_rows=SHARD_ROWS,
+             now=None, profile='uniform'):
+    """Write users.csv, messages.csv and follows.csv into `out`, shaped by
+    the named dataset `profile`."""
+
+    profile = PROFILES[profile]
+
+    if follows > users * (users - 1):
+        raise ValueError("More follows requested than there are user pairs")
+
+    now = now or datetime.now()
+    os.makedirs(out, exist_ok=True)
+
+    def part(kind, shard):
+        return os.path.join(out, f"{kind}.csv.part{shard:05d}")
+
+    jobs = {'users': [], 'messages': [], 'follows': []}
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        user_shards = split(users, max(-(-users // shard_rows), 1))
+        first_id = 1
+        for shard, count in enumerate(user_shards):
+            jobs['users'].append((part('users', shard), pool.submit(
+                write_users, part('users', shard), seed, shard, first_id, count)))
+            first_id += count
+
+        for shard, count in enumerate(split(messages, max(-(-messages // shard_rows), 1))):
+            jobs['messages'].append((part('messages', shard), pool.submit(
+                write_messages, part('messages', shard), seed, shard, count,
+                users, now, profile)))
+
+        if profile.follower_skew is None and not profile.celebrities:
+            submit_uniform_follows(pool, jobs, part, seed, users, follows,
+                                   shard_rows)
+        else:
+            submit_skewed_follows(pool, jobs, part, seed, users,
+                                  follower_counts(profile, users, follows),
+                                  shard_rows)
+
+        for kind, headers in [('users', USERS_CSV_HEADERS),
+                              ('messages', MESSAGES_CSV_HEADERS),
+                              ('follows', FOLLOWS_CSV_HEADERS)]:
+            for _, future in jobs[kind]:
+                future.result()
+            concatenate(os.path.join(out, f"{kind}.csv"), headers,
+                        [path for path, _ in jobs[kind]])
+            print(f"{kind}.csv written", file=sys.stderr)
+
+
+def submit_uniform_follows(pool, jobs, part, seed, users, follows, shard_rows):
+    """Queue shards of uniformly random follows."""
+
+    # Each shard samples from its own slice of the pair numbers, with its
+    # share of the follows in proportion to the slice's size.
+    num_pairs = users * (users - 1)
+    follow_shards = max(-(-follows // shard_rows), 1)
+    bounds = [num_pairs * i // follow_shards for i in range(follow_shards + 1)]
+    counts = [follows * bounds[i + 1] // num_pairs - follows * bounds[i] // num_pairs
+              for i in range(follow_shards)]
+
+    for shard, count in enumerate(counts):
+        jobs['follows'].append((part('follows', shard), pool.submit(
+            write_follows, part('follows', shard), seed, shard,
+            bounds[shard], bounds[shard + 1], count, users)))
+
+
+def submit_skewed_follows(pool, jobs, part, seed, users, counts, shard_rows):
+    """Queue shards of follows with `counts[i]` followers for user i + 1,
+    cutting shards at about `shard_rows` follows each."""
+
+    shard = 0
+    first = 0
+    rows = 0
+
+    for i, count in enumerate(counts):
+        rows += count
+        if rows >= shard_rows or i == len(counts) - 1:
+            jobs['follows'].append((part('follows', shard), pool.submit(
+                write_skewed_follows, part('follows', shard), seed, shard,
+                first + 1, counts[first:i + 1], users)))
+            shard += 1
+            first = i + 1
+            rows = 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate Warbler CSVs.")
+    parser.add_argument('--users', type=int, default=NUM_USERS)
+    parser.add_argument('--messages', type=int, default=NUM_MESSAGES)
+    parser.add_argument('--follows', type=int, default=NUM_FOLLWERS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None,
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument('--shard-rows', type=int, default=SHARD_ROWS)
+    parser.add_argument('--now', type=datetime.fromisoformat, default=None,
+                        help="latest message time, for reproducible output")
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='uniform',
+                        help="shape of the social graph (see profiles.py)")
+    parser.add_argument('--out', default='generator')
+    args = parser.parse_args()
+
+    generate(out=args.out, users=args.users, messages=args.messages,
+             follows=args.follows, seed=args.seed, workers=args.workers,
+             shard_rows=args.shard_rows, now=args.now, profile=args.profile)
+
+
+if __name__ == '__main__':
+    main()
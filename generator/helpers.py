@@ -1,7 +1,9 @@
 """Support functions for CSV generation."""
 
+import random
 from datetime import datetime
-from random import uniform
+
+import numpy as np
 
 
 def get_random_datetime(year_gap=2):
@@ -9,6 +11,23 @@ def get_random_datetime(year_gap=2):
 
     now = datetime.now()
     then = now.replace(year=now.year - year_gap)
-    random_timestamp = uniform(then.timestamp(), now.timestamp())
+    random_timestamp = random.uniform(then.timestamp(), now.timestamp())
 
     return datetime.fromtimestamp(random_timestamp)
+
+
+def get_random_datetimes(count, year_gap=2, now=None, rng=None):
+    """Get `count` random datetimes within the `year_gap` years before `now`.
+
+    Batch version of get_random_datetime: `rng` (a numpy Generator, seeded
+    for reproducible output) draws all the offsets as one array, which is
+    added to the start of the range in one step.
+    """
+
+    rng = rng or np.random.default_rng()
+    now = now or datetime.now()
+    start = np.datetime64(now.replace(year=now.year - year_gap), 'us')
+    span = (np.datetime64(now, 'us') - start).astype(np.int64)
+
+    offsets = rng.integers(0, span, size=count).astype('timedelta64[us]')
+    return (start + offsets).tolist()
@@ -0,0 +1,99 @@
+"""Named dataset profiles for generating Warbler benchmark data.
+
+Real social graphs are skewed: a few accounts have enormous followings,
+a few users post most of the messages, and posting comes in bursts. These
+profiles let create_csvs.py reproduce that shape (pass --profile NAME) so
+fan-out, counters and follower pages get load-tested against it.
+
+Celebrities are always the lowest user ids (user 1 has the most
+followers), which makes them easy to find in benchmarks.
+"""
+
+from collections import namedtuple
+from math import exp, floor, log
+
+Profile = namedtuple('Profile', [
+    'description',
+    # Zipf exponent for how follows are spread over followed users
+    # (None: uniform random pairs).
+    'follower_skew',
+    # How many celebrity accounts, and how many followers each gets
+    # (capped at everyone else).
+    'celebrities',
+    'celebrity_followers',
+    # Zipf exponent for how messages are spread over authors (None: uniform).
+    'author_skew',
+    # Fraction of messages posted in bursts of `burst_size` messages by one
+    # author within `burst_minutes`.
+    'burst_fraction',
+    'burst_size',
+    'burst_minutes',
+])
+
+PROFILES = {
+    'uniform': Profile(
+        description="Uniform random follows and authors (the original data).",
+        follower_skew=None, celebrities=0, celebrity_followers=0,
+        author_skew=None, burst_fraction=0, burst_size=1, burst_minutes=0),
+    'zipf': Profile(
+        description="Zipf-distributed follower counts and posting volume.",
+        follower_skew=1.0, celebrities=0, celebrity_followers=0,
+        author_skew=1.1, burst_fraction=0, burst_size=1, burst_minutes=0),
+    'celebrity': Profile(
+        description="Zipf follows plus 5 accounts with 1M followers each.",
+        follower_skew=1.0, celebrities=5, celebrity_followers=1_000_000,
+        author_skew=1.1, burst_fraction=0, burst_size=1, burst_minutes=0),
+    'bursty': Profile(
+        description="Celebrity graph with 30% of messages posted in bursts.",
+        follower_skew=1.0, celebrities=5, celebrity_followers=1_000_000,
+        author_skew=1.1, burst_fraction=0.3, burst_size=20, burst_minutes=10),
+}
+
+
+def zipf_rank(u, n, s):
+    """Rank in 1..n for a uniform draw `u` in [0, 1), from a (continuous
+    approximation of a) Zipf distribution with exponent `s`."""
+
+    if s == 1:
+        rank = exp(u * log(n + 1))
+    else:
+        rank = (u * ((n + 1) ** (1 - s) - 1) + 1) ** (1 / (1 - s))
+    return min(max(floor(rank), 1), n)
+
+
+def spread(rank, n):
+    """Map rank 1..n onto user ids 1..n in a fixed scrambled order, so
+    e.g. the heaviest posters aren't simply the first users."""
+
+    step = 1_000_003 if n % 1_000_003 else 999_983
+    return (rank - 1) * step % n + 1
+
+
+def follower_counts(profile, num_users, num_follows):
+    """Followers each user gets, as a list indexed by user id - 1.
+
+    Celebrities (the first ids) get their fixed count; the remaining
+    follows are shared by everyone else in Zipf proportions by id. Nobody
+    can have more than num_users - 1 followers, so with heavy skew the
+    total can come out a little under `num_follows`.
+    """
+
+    most = num_users - 1
+    celebrities = min(profile.celebrities, num_users)
+    counts = [min(profile.celebrity_followers, most)] * celebrities
+
+    remaining = max(num_follows - sum(counts), 0)
+    others = num_users - celebrities
+    if not others:
+        return counts
+
+    if profile.follower_skew is None:
+        weights = [1.0] * others
+    else:
+        weights = [rank ** -profile.follower_skew
+                   for rank in range(1, others + 1)]
+    total = sum(weights)
+
+    counts.extend(min(round(remaining * weight / total), most)
+                  for weight in weights)
+    return counts
@@ -0,0 +1,118 @@
+"""Password hashing for Warbler.
+
+bcrypt is deliberately slow (~250ms of CPU at cost 12), so hashing and
+checking run in a bounded process pool instead of on the request thread.
+With `workers=0` everything runs inline, which is handy for tests.
+"""
+
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from threading import BoundedSemaphore, Lock
+
+import bcrypt
+
+BCRYPT_COST = re.compile(r'^\$2[aby]?\$(\d\d)\$')
+
+
+class HashingUnavailable(Exception):
+    """The hashing pool couldn't take or finish the job in time."""
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode('UTF-8')
+
+
+def _check(password, hashed):
+    return bcrypt.checkpw(password, hashed)
+
+
+class PasswordHasher:
+    """bcrypt hashing with a configurable cost, run in a process pool.
+
+    At most `max_pending` jobs may be queued or running at once; further
+    callers wait up to `timeout` seconds for room, and then for their
+    result, before getting HashingUnavailable.
+    """
+
+    def __init__(self, rounds=12, workers=None, max_pending=None, timeout=5):
+        self.configure(rounds, workers, max_pending, timeout)
+        self._pool = None
+        self._pool_lock = Lock()
+
+    def configure(self, rounds=12, workers=None, max_pending=None, timeout=5):
+        """(Re)set the tunables; takes effect before the pool first starts."""
+
+        self.rounds = rounds
+        self.workers = os.cpu_count() if workers is None else workers
+        self.max_pending = max_pending or max(self.workers, 1) * 4
+        self.timeout = timeout
+        self._slots = BoundedSemaphore(self.max_pending)
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+
+        slots = self._slots
+        if not slots.acquire(timeout=self.timeout):
+            raise HashingUnavailable("Too many password hashes queued")
+
+        try:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                pool = self._pool
+            future = pool.submit(fn, *args)
+        except BrokenProcessPool as exc:
+            slots.release()
+            self._discard(pool)
+            raise HashingUnavailable("Password hashing pool crashed") from exc
+        except BaseException:
+            slots.release()
+            raise
+
+        # The slot is freed when the job finishes, not when we give up
+        # waiting for it, so timed-out jobs still count against max_pending.
+        future.add_done_callback(lambda future: slots.release())
+
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HashingUnavailable("Password hash timed out")
+        except BrokenProcessPool as exc:
+            self._discard(pool)
+            raise HashingUnavailable("Password hashing pool crashed") from exc
+
+    def _discard(self, pool):
+        """Forget a broken `pool`, so the next job starts a new one."""
+
+        with self._pool_lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False)
+
+    def hash(self, password):
+        """Hash `password` at the configured cost."""
+
+        return self._run(_hash, password.encode('UTF-8'), self.rounds)
+
+    def check(self, hashed, password):
+        """Does `password` match the stored hash `hashed`?"""
+
+        return self._run(_check, password.encode('UTF-8'),
+                         hashed.encode('UTF-8'))
+
+    def needs_rehash(self, hashed):
+        """Was `hashed` made with a different cost than the configured one?"""
+
+        match = BCRYPT_COST.match(hashed)
+        return not match or int(match.group(1)) != self.rounds
+
+    def shutdown(self):
+        """Stop the worker processes, if started."""
+
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
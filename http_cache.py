@@ -0,0 +1,52 @@
+"""Conditional HTTP caching for Warbler's read routes.
+
+Routes build a strong ETag from the versions of the data a page shows
+(see `make_etag`) and hand `conditional_response` a function that renders
+the page; if the client already has that version, we answer 304 without
+rendering anything.
+"""
+
+import hashlib
+
+from flask import current_app, make_response, request, session
+
+
+def make_etag(*parts):
+    """Strong ETag for the current page built from `parts` (ids, versions,
+    ...). ETAG_VERSION should be changed when templates change."""
+
+    parts = (current_app.config.get('ETAG_VERSION'), request.full_path) + parts
+    return hashlib.sha1(repr(parts).encode('UTF-8')).hexdigest()
+
+
+def is_fresh(etag):
+    """Does the client's cached copy match `etag`?"""
+
+    # A pending flash message would be lost in a 304, so always render.
+    if session.get('_flashes'):
+        return False
+
+    return request.if_none_match.contains(etag)
+
+
+def conditional_response(etag, render, private):
+    """Respond 304 if the client is fresh, else with `render()`.
+
+    Pages that depend on who is logged in are `private` so shared caches
+    won't serve them to other users; either way clients must revalidate.
+    """
+
+    if is_fresh(etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(render())
+
+    response.set_etag(etag)
+
+    if private:
+        response.cache_control.private = True
+    else:
+        response.cache_control.public = True
+    response.cache_control.no_cache = True
+
+    return response
@@ -0,0 +1,93 @@
+"""Helpers for Warbler's read-only JSON API.
+
+API routes read through the same model methods as the HTML pages, but ask
+for just the columns a client wants (`?fields=id,text`). Responses are
+compact JSON, serialized with orjson when it is installed, and list pages
+are streamed in chunks rather than built up as one big string.
+"""
+
+import json
+
+from flask import Response, abort, request
+
+from models import Message, User, UserCard
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Field names clients can ask for, and the columns they come from.
+MESSAGE_FIELDS = {
+    'id': Message.id,
+    'text': Message.text,
+    'timestamp': Message.timestamp,
+    'user_id': Message.user_id,
+    'likes_count': Message.likes_count,
+    'username': User.username,
+    'image_url': User.image_url,
+}
+
+USER_FIELDS = {field: getattr(User, field)
+               for field in UserCard._fields if field != 'version'}
+
+# Items serialized per chunk of a streamed response.
+STREAM_CHUNK_ITEMS = 100
+
+
+def dumps(obj):
+    """`obj` as compact JSON bytes; datetimes become ISO 8601 strings."""
+
+    if orjson:
+        return orjson.dumps(obj)
+
+    return json.dumps(obj, separators=(',', ':'),
+                      default=lambda value: value.isoformat()).encode('UTF-8')
+
+
+def requested_fields(available, required=('id',)):
+    """The field names in ?fields= (default: all of `available`), and the
+    columns to query for them plus the `required` ones needed for paging.
+
+    Aborts with 400 on an unknown field.
+    """
+
+    names = request.args.get('fields')
+    fields = names.split(',') if names else list(available)
+
+    if not set(fields) <= set(available):
+        abort(400)
+
+    columns = [available[field]
+               for field in dict.fromkeys([*required, *fields])]
+    return fields, columns
+
+
+def item(row, fields):
+    """Dict of just `fields` of `row`."""
+
+    return {field: getattr(row, field) for field in fields}
+
+
+def item_response(row, fields):
+    """JSON response with one item."""
+
+    return Response(dumps(item(row, fields)), mimetype='application/json')
+
+
+def page_response(rows, fields, **extra):
+    """Streamed JSON response like {"items": [...], **extra}, with each row
+    cut down to `fields`."""
+
+    def generate():
+        yield b'{"items":['
+        for start in range(0, len(rows), STREAM_CHUNK_ITEMS):
+            chunk = rows[start:start + STREAM_CHUNK_ITEMS]
+            yield ((b',' if start else b'')
+                   + b','.join(dumps(item(row, fields)) for row in chunk))
+        yield b']'
+        for key, value in extra.items():
+            yield b',' + dumps(key) + b':' + dumps(value)
+        yield b'}'
+
+    return Response(generate(), mimetype='application/json')
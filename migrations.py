@@ -0,0 +1,182 @@
+"""Schema migrations for Warbler.
+
+The models define the current schema; MIGRATIONS bring a database made by
+older versions of them up to date, and the schema_migrations table records
+which have been applied.
+
+- An empty database just gets the current schema from the models, and
+  every migration is recorded as applied.
+- A database from before migrations existed (tables, but no
+  schema_migrations) runs all of them, so each is written to be safe on a
+  schema that already has some of its changes (IF [NOT] EXISTS).
+- Otherwise only the pending migrations run, in order.
+
+Migrations are written for Postgres; local SQLite databases are always
+created fresh. Each runs in its own transaction, except those marked
+`concurrent`, which build indexes with CREATE INDEX CONCURRENTLY so that
+writes to the table carry on meanwhile (which can't be done inside a
+transaction).
+
+Apply them with:
+
+    FLASK_APP=app flask migrate
+"""
+
+import sys
+from collections import namedtuple
+
+from sqlalchemy import (Column, DateTime, Integer, MetaData, String, Table,
+                        func, inspect, select, text)
+
+from models import db, USER_SEARCH_INDEXES
+
+Migration = namedtuple('Migration', [
+    'version',
+    'description',
+    # SQL strings, or functions taking a connection
+    'statements',
+    'concurrent',
+])
+
+schema_migrations = Table(
+    'schema_migrations', MetaData(),
+    Column('version', Integer, primary_key=True, autoincrement=False),
+    Column('description', String, nullable=False),
+    Column('applied_at', DateTime, nullable=False, server_default=func.now()),
+)
+
+
+def create_missing_tables(conn):
+    """Create tables the models define but the database lacks."""
+
+    db.metadata.create_all(bind=conn, checkfirst=True)
+
+
+MIGRATIONS = [
+    Migration(1, "Denormalized counters and versions", [
+        "ALTER TABLE users "
+        "ADD COLUMN IF NOT EXISTS messages_count integer NOT NULL DEFAULT 0, "
+        "ADD COLUMN IF NOT EXISTS followers_count integer NOT NULL DEFAULT 0, "
+        "ADD COLUMN IF NOT EXISTS following_count integer NOT NULL DEFAULT 0, "
+        "ADD COLUMN IF NOT EXISTS likes_count integer NOT NULL DEFAULT 0, "
+        "ADD COLUMN IF NOT EXISTS version integer NOT NULL DEFAULT 1",
+        "ALTER TABLE messages "
+        "ADD COLUMN IF NOT EXISTS likes_count integer NOT NULL DEFAULT 0",
+    ], concurrent=False),
+
+    # Afterwards, run `flask rebuild-timelines` and `flask reconcile-counts`.
+    # The username search indexes that used to be built here are built
+    # concurrently by migration 7.
+    Migration(2, "Timelines, recommendations and username search indexes", [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        create_missing_tables,
+    ], concurrent=False),
+
+    Migration(3, "Key likes on (user_id, message_id)", [
+        "DELETE FROM likes WHERE user_id IS NULL OR message_id IS NULL",
+        "ALTER TABLE likes DROP CONSTRAINT IF EXISTS likes_message_id_key",
+        "ALTER TABLE likes DROP CONSTRAINT IF EXISTS likes_pkey",
+        "ALTER TABLE likes DROP COLUMN IF EXISTS id",
+        "ALTER TABLE likes ADD CONSTRAINT likes_pkey "
+        "PRIMARY KEY (user_id, message_id)",
+    ], concurrent=False),
+
+    # If one of these fails part way it leaves an INVALID index behind,
+    # which IF NOT EXISTS would then skip: drop it before retrying.
+    Migration(4, "Indexes for profile, home timeline and follow lookups", [
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_messages_user_id_timestamp "
+        "ON messages (user_id, timestamp DESC, id DESC)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_messages_timestamp_id "
+        "ON messages (timestamp DESC, id)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_follows_user_following_id "
+        "ON follows (user_following_id, user_being_followed_id)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_likes_message_id "
+        "ON likes (message_id)",
+    ], concurrent=True),
+
+    # Message timestamps used to default to when the app process started;
+    # the database stamps them now. Existing rows are left as they are:
+    # (timestamp, id) orders them even where timestamps repeat.
+    Migration(5, "Server-side message timestamps", [
+        "ALTER TABLE messages "
+        "ALTER COLUMN timestamp SET DEFAULT TIMEZONE('utc', CURRENT_TIMESTAMP)",
+    ], concurrent=False),
+
+    Migration(6, "Index timeline entries by message", [
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_timelines_message_id "
+        "ON timelines (message_id)",
+    ], concurrent=True),
+
+    Migration(7, "Username search indexes, timeline index in keyset order", [
+        *[ddl.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY IF NOT EXISTS", 1)
+          for ddl in USER_SEARCH_INDEXES.values()],
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS "
+        "ix_timelines_user_id_timestamp_message_id "
+        "ON timelines (user_id, timestamp DESC, message_id DESC)",
+        "DROP INDEX CONCURRENTLY IF EXISTS ix_timelines_user_id_timestamp",
+    ], concurrent=True),
+]
+
+
+def print_progress(migration):
+    """Default progress report: each migration as it's applied."""
+
+    print(f"Applying {migration.version}: {migration.description}",
+          file=sys.stderr)
+
+
+def run_statements(conn, statements):
+    for statement in statements:
+        if callable(statement):
+            statement(conn)
+        else:
+            conn.execute(text(statement))
+
+
+def record(conn, migrations):
+    conn.execute(schema_migrations.insert(),
+                 [{'version': migration.version,
+                   'description': migration.description}
+                  for migration in migrations])
+
+
+def migrate(engine, progress=print_progress):
+    """Bring the database up to date; returns the migrations applied."""
+
+    existing = set(inspect(engine).get_table_names()) & set(db.metadata.tables)
+
+    with engine.begin() as conn:
+        schema_migrations.create(conn, checkfirst=True)
+
+        if not existing:
+            db.metadata.create_all(bind=conn)
+            record(conn, MIGRATIONS)
+            return []
+
+        applied = set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+    pending = [migration for migration in MIGRATIONS
+               if migration.version not in applied]
+
+    for migration in pending:
+        progress(migration)
+
+        if migration.concurrent:
+            with engine.connect() as conn:
+                conn = conn.execution_options(isolation_level='AUTOCOMMIT')
+                run_statements(conn, migration.statements)
+            with engine.begin() as conn:
+                record(conn, [migration])
+        else:
+            with engine.begin() as conn:
+                run_statements(conn, migration.statements)
+                record(conn, [migration])
+
+    return pending
+
+
+def reset(engine):
+    """Drop every table, so the next migrate starts from an empty database."""
+
+    db.metadata.drop_all(bind=engine)
+    schema_migrations.drop(bind=engine, checkfirst=True)
@@ -1,18 +1,63 @@
 """SQLAlchemy models for Warbler."""
 
-from datetime import datetime
+import os
+import sqlite3
+from collections import namedtuple
 
-from flask_bcrypt import Bcrypt
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import DDL, MetaData, and_, event, exists, func, literal, or_, select, tuple_, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.sql.expression import FunctionElement
 
-bcrypt = Bcrypt()
-db = SQLAlchemy()
+from hashing import PasswordHasher
+from pagination import keyset_page
+from replicas import ReplicaRouter, RoutingSQLAlchemy
+
+# Constraint names match Postgres' own defaults, so existing databases
+# line up and tools like bulk_load can drop and re-add them by name.
+NAMING_CONVENTION = {
+    'ix': 'ix_%(column_0_label)s',
+    'uq': '%(table_name)s_%(column_0_name)s_key',
+    'fk': '%(table_name)s_%(column_0_name)s_fkey',
+    'pk': '%(table_name)s_pkey',
+}
+
+hasher = PasswordHasher()
+db = RoutingSQLAlchemy(metadata=MetaData(naming_convention=NAMING_CONVENTION))
+replica_router = ReplicaRouter(db)
+
+# How many messages each materialized home timeline keeps. Posting doesn't
+# trim timelines (that would sort every follower's timeline on each post),
+# so they run over this until `flask trim-timelines`, run periodically,
+# cuts them back; pages read are bounded by their LIMIT either way.
+TIMELINE_LENGTH = 800
+
+# Users whose timelines are trimmed per transaction by trim-timelines.
+TRIM_BATCH_USERS = 1000
+
+# Default loading strategies ('select', 'selectin', 'joined', ...) for the
+# Message.user and User.messages relationships. Authors are batch-loaded
+# so lists of messages don't lazy-load each author separately; a user's
+# messages stay lazy since there can be very many of them.
+MESSAGE_USER_LOADING = os.environ.get('MESSAGE_USER_LOADING', 'selectin')
+USER_MESSAGES_LOADING = os.environ.get('USER_MESSAGES_LOADING', 'select')
+
+# Shortest search term the pg_trgm index can serve; shorter terms are
+# matched as username prefixes instead.
+TRIGRAM_MIN_LENGTH = 3
 
 
 class Follows(db.Model):
     """Connection of a follower <-> followed_user."""
 
     __tablename__ = 'follows'
+    # The primary key serves "who follows X"; this serves "who does X follow".
+    __table_args__ = (
+        db.Index('ix_follows_user_following_id',
+                 'user_following_id', 'user_being_followed_id'),
+    )
 
     user_being_followed_id = db.Column(
         db.Integer,
@@ -26,28 +71,191 @@ class Follows(db.Model):
         primary_key=True,
     )
 
+    # Both of these are single statements that never load anyone's
+    # followers or following, so they cost the same however many follows
+    # a user has. Postgres reports the rows changed with RETURNING; SQLite
+    # (for local runs) looks them up first instead.
+
+    @classmethod
+    def add(cls, follower_id, followed_ids):
+        """Have `follower_id` follow every existing user in `followed_ids`,
+        with one INSERT ... ON CONFLICT DO NOTHING.
+
+        Returns the ids of the users who weren't already followed.
+        """
+
+        followed_ids = set(followed_ids) - {follower_id}
+        if not followed_ids:
+            return []
+
+        dialect = db.engine.dialect.name
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        statement = (insert(cls.__table__)
+                     .from_select(
+                         ['user_being_followed_id', 'user_following_id'],
+                         select(User.id, literal(follower_id))
+                         .where(User.id.in_(followed_ids)))
+                     .on_conflict_do_nothing())
+
+        if dialect == 'postgresql':
+            return db.session.execute(
+                statement.returning(cls.user_being_followed_id)).scalars().all()
+
+        already = set(cls._followed_among(follower_id, followed_ids))
+        db.session.execute(statement)
+        return cls._followed_among(follower_id, followed_ids - already)
+
+    @classmethod
+    def remove(cls, follower_id, followed_ids):
+        """Have `follower_id` stop following every user in `followed_ids`,
+        with one DELETE.
+
+        Returns the ids of the users who were followed.
+        """
+
+        followed_ids = set(followed_ids)
+        if not followed_ids:
+            return []
+
+        statement = (cls.__table__.delete()
+                     .where(cls.user_following_id == follower_id)
+                     .where(cls.user_being_followed_id.in_(followed_ids)))
+
+        if db.engine.dialect.name == 'postgresql':
+            return db.session.execute(
+                statement.returning(cls.user_being_followed_id)).scalars().all()
+
+        removed = cls._followed_among(follower_id, followed_ids)
+        db.session.execute(statement)
+        return removed
+
+    @classmethod
+    def _followed_among(cls, follower_id, followed_ids):
+        """Which of `followed_ids` `follower_id` follows."""
+
+        if not followed_ids:
+            return []
+
+        return (db.session
+                .execute(select(cls.user_being_followed_id)
+                         .where(cls.user_following_id == follower_id)
+                         .where(cls.user_being_followed_id.in_(followed_ids)))
+                .scalars().all())
+
+
+class FollowState:
+    """Follow relationships between a viewer and a page of users.
+
+    Loaded with one query so templates can check each card with a set
+    lookup instead of asking the database (or a relationship) per user.
+    """
+
+    def __init__(self, viewer_id, user_ids):
+        self.following = set()
+        self.followed_by = set()
+
+        user_ids = set(user_ids)
+        if viewer_id is None or not user_ids:
+            return
+
+        rows = (db.session
+                .query(Follows.user_being_followed_id,
+                       Follows.user_following_id)
+                .filter(or_(
+                    and_(Follows.user_following_id == viewer_id,
+                         Follows.user_being_followed_id.in_(user_ids)),
+                    and_(Follows.user_being_followed_id == viewer_id,
+                         Follows.user_following_id.in_(user_ids)))))
+
+        for followed_id, follower_id in rows:
+            if follower_id == viewer_id:
+                self.following.add(followed_id)
+            if followed_id == viewer_id:
+                self.followed_by.add(follower_id)
+
+    def is_following(self, other_user):
+        """Is the viewer following `other_user`?"""
+
+        return other_user.id in self.following
+
+    def is_followed_by(self, other_user):
+        """Is the viewer followed by `other_user`?"""
+
+        return other_user.id in self.followed_by
+
+
+# Just what a user card on the follower/following pages shows, plus the
+# version for ETags; much lighter than loading whole User rows.
+UserCard = namedtuple('UserCard', [
+    'id',
+    'username',
+    'image_url',
+    'header_image_url',
+    'bio',
+    'version',
+])
+
 
 class Likes(db.Model):
     """Mapping user likes to warbles."""
 
-    __tablename__ = 'likes' 
-
-    id = db.Column(
-        db.Integer,
-        primary_key=True
+    __tablename__ = 'likes'
+    # The primary key serves a user's likes; this serves a message's.
+    __table_args__ = (
+        db.Index('ix_likes_message_id', 'message_id'),
     )
 
     user_id = db.Column(
         db.Integer,
-        db.ForeignKey('users.id', ondelete='cascade')
+        db.ForeignKey('users.id', ondelete='cascade'),
+        primary_key=True,
     )
 
     message_id = db.Column(
         db.Integer,
         db.ForeignKey('messages.id', ondelete='cascade'),
-        unique=True
+        primary_key=True,
     )
 
+    @classmethod
+    def liked_ids(cls, user_id, message_ids):
+        """The set of `message_ids` that `user_id` has liked, in one query."""
+
+        message_ids = set(message_ids)
+        if user_id is None or not message_ids:
+            return set()
+
+        rows = (db.session
+                .query(cls.message_id)
+                .filter(cls.user_id == user_id,
+                        cls.message_id.in_(message_ids)))
+
+        return {message_id for message_id, in rows}
+
+    @classmethod
+    def add(cls, user_id, message_id):
+        """Have `user_id` like `message_id`; False if they already do.
+
+        One INSERT ... ON CONFLICT DO NOTHING, so two requests liking the
+        same message at once can't both insert it.
+        """
+
+        insert = (postgresql.insert if db.engine.dialect.name == 'postgresql'
+                  else sqlite.insert)
+        result = db.session.execute(
+            insert(cls.__table__)
+            .values(user_id=user_id, message_id=message_id)
+            .on_conflict_do_nothing())
+        return result.rowcount == 1
+
+    @classmethod
+    def remove(cls, user_id, message_id):
+        """Have `user_id` stop liking `message_id`; False if they didn't."""
+
+        return bool(cls.query
+                    .filter_by(user_id=user_id, message_id=message_id)
+                    .delete(synchronize_session=False))
+
 
 class User(db.Model):
     """User in the system."""
@@ -94,41 +302,280 @@ class User(db.Model):
         nullable=False,
     )
 
-    messages = db.relationship('Message')
+    # Denormalized counts, kept in step by the routes that change them
+    # (see `bump`) and recomputed by `reconcile_counts`.
+
+    messages_count = db.Column(
+        db.Integer,
+        nullable=False,
+        default=0,
+        server_default='0',
+    )
+
+    followers_count = db.Column(
+        db.Integer,
+        nullable=False,
+        default=0,
+        server_default='0',
+    )
+
+    following_count = db.Column(
+        db.Integer,
+        nullable=False,
+        default=0,
+        server_default='0',
+    )
+
+    likes_count = db.Column(
+        db.Integer,
+        nullable=False,
+        default=0,
+        server_default='0',
+    )
+
+    # Bumped whenever anything shown on this user's pages changes (profile,
+    # counters); used to build HTTP ETags.
+    version = db.Column(
+        db.Integer,
+        nullable=False,
+        default=1,
+        server_default='1',
+    )
+
+    # passive_deletes: let the database's ON DELETE CASCADE clean these up
+    # rather than loading every related row when a user is deleted.
+
+    messages = db.relationship(
+        'Message',
+        back_populates='user',
+        lazy=USER_MESSAGES_LOADING,
+        passive_deletes=True,
+    )
 
     followers = db.relationship(
         "User",
         secondary="follows",
         primaryjoin=(Follows.user_being_followed_id == id),
-        secondaryjoin=(Follows.user_following_id == id)
+        secondaryjoin=(Follows.user_following_id == id),
+        passive_deletes=True,
     )
 
     following = db.relationship(
         "User",
         secondary="follows",
         primaryjoin=(Follows.user_following_id == id),
-        secondaryjoin=(Follows.user_being_followed_id == id)
+        secondaryjoin=(Follows.user_being_followed_id == id),
+        passive_deletes=True,
     )
 
     likes = db.relationship(
         'Message',
-        secondary="likes"
+        secondary="likes",
+        passive_deletes=True,
     )
 
     def __repr__(self):
         return f"<User #{self.id}: {self.username}, {self.email}>"
 
+    @classmethod
+    def bump(cls, counter, user_ids, delta=1):
+        """Add `delta` to the `counter` column of every user in `user_ids`
+        (a list of ids or a select of ids), bumping their version too.
+
+        This is a single UPDATE of `counter = counter + delta`, so it is
+        safe against concurrent requests changing the same counter.
+        """
+
+        db.session.execute(
+            cls.__table__.update()
+            .where(cls.id.in_(user_ids))
+            .values({counter: counter + delta, cls.version: cls.version + 1}))
+
+    @classmethod
+    def reconcile_counts(cls):
+        """Recompute every user's counters from follows, messages and likes,
+        and every message's like counter."""
+
+        def count_of(model, where):
+            return (select(func.count())
+                    .select_from(model)
+                    .where(where)
+                    .scalar_subquery())
+
+        db.session.execute(
+            cls.__table__.update().values({
+                cls.messages_count: count_of(
+                    Message, Message.user_id == cls.id),
+                cls.followers_count: count_of(
+                    Follows, Follows.user_being_followed_id == cls.id),
+                cls.following_count: count_of(
+                    Follows, Follows.user_following_id == cls.id),
+                cls.likes_count: count_of(
+                    Likes, Likes.user_id == cls.id),
+                cls.version: cls.version + 1,
+            }))
+
+        db.session.execute(
+            Message.__table__.update().values({
+                Message.likes_count: count_of(
+                    Likes, Likes.message_id == Message.id),
+            }))
+
+    def release_counters(self):
+        """Take this user's follows and likes, and the likes on this user's
+        messages, out of other users' and messages' counters. Call this
+        before deleting the user."""
+
+        User.bump(User.followers_count,
+                  select(Follows.user_being_followed_id)
+                  .where(Follows.user_following_id == self.id),
+                  -1)
+
+        User.bump(User.following_count,
+                  select(Follows.user_following_id)
+                  .where(Follows.user_being_followed_id == self.id),
+                  -1)
+
+        likes_on_own_messages = (select(func.count())
+                                 .select_from(Likes)
+                                 .join(Message, Message.id == Likes.message_id)
+                                 .where(Message.user_id == self.id)
+                                 .where(Likes.user_id == User.id)
+                                 .scalar_subquery())
+
+        db.session.execute(
+            User.__table__.update()
+            .where(User.id.in_(
+                select(Likes.user_id)
+                .join(Message, Message.id == Likes.message_id)
+                .where(Message.user_id == self.id)))
+            .values({User.likes_count:
+                     User.likes_count - likes_on_own_messages,
+                     User.version: User.version + 1}))
+
+        Message.bump_likes(select(Likes.message_id)
+                           .where(Likes.user_id == self.id),
+                           -1)
+
     def is_followed_by(self, other_user):
-        """Is this user followed by `other_user`?"""
+        """Is this user followed by `other_user`?
+
+        A primary-key EXISTS check; for a page of users use FollowState.
+        """
 
-        found_user_list = [user for user in self.followers if user == other_user]
-        return len(found_user_list) == 1
+        return db.session.query(
+            exists()
+            .where(Follows.user_being_followed_id == self.id)
+            .where(Follows.user_following_id == other_user.id)).scalar()
 
     def is_following(self, other_user):
-        """Is this user following `other_user`?"""
+        """Is this user following `other_user`?
+
+        A primary-key EXISTS check; for a page of users use FollowState.
+        """
+
+        return db.session.query(
+            exists()
+            .where(Follows.user_following_id == self.id)
+            .where(Follows.user_being_followed_id == other_user.id)).scalar()
+
+    @classmethod
+    def directory(cls, after=None, per_page=60):
+        """A page of all users in id order, starting after user `after`.
+
+        Returns (users, has_more).
+        """
+
+        query = cls.query
+        if after:
+            query = query.filter(cls.id > after)
+
+        users = query.order_by(cls.id).limit(per_page + 1).all()
+        return users[:per_page], len(users) > per_page
+
+    @classmethod
+    def follower_cards(cls, user_id, after=None, per_page=60,
+                       fields=UserCard._fields):
+        """A page of UserCards for the followers of `user_id`, in id order,
+        starting after user `after`. Other `fields` (names of User
+        columns, including 'id') give rows of just those columns instead.
+
+        Returns (cards, has_more).
+        """
+
+        return cls._follow_cards(Follows.user_being_followed_id,
+                                 Follows.user_following_id,
+                                 user_id, after, per_page, fields)
+
+    @classmethod
+    def following_cards(cls, user_id, after=None, per_page=60,
+                        fields=UserCard._fields):
+        """A page of UserCards for the users `user_id` follows, in id order,
+        starting after user `after`. Other `fields` (names of User
+        columns, including 'id') give rows of just those columns instead.
 
-        found_user_list = [user for user in self.following if user == other_user]
-        return len(found_user_list) == 1
+        Returns (cards, has_more).
+        """
+
+        return cls._follow_cards(Follows.user_following_id,
+                                 Follows.user_being_followed_id,
+                                 user_id, after, per_page, fields)
+
+    @classmethod
+    def _follow_cards(cls, own_col, other_col, user_id, after, per_page,
+                      fields):
+        """Cards for the users in `other_col` of the follows whose `own_col`
+        is `user_id`, paged by `other_col` so each page is one index range."""
+
+        query = (db.session
+                 .query(*[getattr(cls, field) for field in fields])
+                 .join(Follows, other_col == cls.id)
+                 .filter(own_col == user_id))
+        if after:
+            query = query.filter(other_col > after)
+
+        rows = query.order_by(other_col).limit(per_page + 1).all()
+        cards = rows[:per_page]
+        if tuple(fields) == UserCard._fields:
+            cards = [UserCard(*row) for row in cards]
+        return cards, len(rows) > per_page
+
+    @classmethod
+    def search(cls, term, page=1, per_page=60):
+        """A page of users whose username contains `term`, best match first
+        (exact, then prefix, then trigram similarity on Postgres).
+
+        Terms shorter than TRIGRAM_MIN_LENGTH only match as a prefix, using
+        the lower(username) pattern index. On other databases (SQLite when
+        testing locally) the same filters run as plain LIKE scans.
+
+        Returns (users, has_more).
+        """
+
+        lowered = term.lower()
+        escaped = (lowered
+                   .replace('\\', '\\\\')
+                   .replace('%', '\\%')
+                   .replace('_', '\\_'))
+        username = func.lower(cls.username)
+        is_prefix = username.like(f"{escaped}%", escape='\\')
+
+        if len(term) < TRIGRAM_MIN_LENGTH:
+            query = cls.query.filter(is_prefix).order_by(username, cls.id)
+        else:
+            ranking = [(username == lowered).desc(), is_prefix.desc()]
+            if db.engine.dialect.name == 'postgresql':
+                ranking.append(func.similarity(username, lowered).desc())
+
+            query = (cls.query
+                     .filter(username.like(f"%{escaped}%", escape='\\'))
+                     .order_by(*ranking, username, cls.id))
+
+        users = (query
+                 .offset((max(page, 1) - 1) * per_page)
+                 .limit(per_page + 1)
+                 .all())
+        return users[:per_page], len(users) > per_page
 
     @classmethod
     def signup(cls, username, email, password, image_url):
@@ -137,7 +584,7 @@ class User(db.Model):
         Hashes password and adds user to system.
         """
 
-        hashed_pwd = bcrypt.generate_password_hash(password).decode('UTF-8')
+        hashed_pwd = hasher.hash(password)
 
         user = User(
             username=username,
@@ -149,23 +596,16 @@ class User(db.Model):
         db.session.add(user)
         return user
 
-@classmethod
-def update(cls, username, email, password, image_url, header_image_url, bio):
-    """Updates a user. Similar to signup with more data."""
+    def update(self, username, email, image_url, header_image_url, bio):
+        """Updates this user's profile. Similar to signup with more data."""
 
-    hashed_pwd = bcrypt.generate_password_hash(password).decode('UTF8')
-
-    user = User(
-        username=username,
-        email=email,
-        password=hashed_pwd,
-        image_url=image_url,
-        header_image_url=header_image_url,
-        bio=bio
-    )
-
-    db.session.add(user)
-    return user
+        self.username = username
+        self.email = email
+        self.image_url = image_url
+        self.header_image_url = header_image_url
+        self.bio = bio
+        self.version = User.version + 1
+        return self
 
     @classmethod
     def authenticate(cls, username, password):
@@ -175,22 +615,81 @@ def update(cls, username, email, password, image_url, header_image_url, bio):
         It searches for a user whose password hash matches this password
         and, if it finds such a user, returns that user object.
 
+        If the stored hash was made with a different bcrypt cost than the
+        one configured, it is replaced with a fresh hash; the caller commits.
+
         If can't find matching user (or if password is wrong), returns False.
         """
 
         user = cls.query.filter_by(username=username).first()
 
         if user:
-            is_auth = bcrypt.check_password_hash(user.password, password)
+            is_auth = hasher.check(user.password, password)
             if is_auth:
+                if hasher.needs_rehash(user.password):
+                    user.password = hasher.hash(password)
                 return user
 
         return False
 
+
+# Username search indexes (see User.search), by name. Postgres only:
+# elsewhere the search falls back to LIKE scans.
+
+USER_SEARCH_INDEXES = {
+    'ix_users_username_trgm':
+        "CREATE INDEX ix_users_username_trgm "
+        "ON users USING gin (lower(username) gin_trgm_ops)",
+    'ix_users_username_prefix':
+        "CREATE INDEX ix_users_username_prefix "
+        "ON users (lower(username) text_pattern_ops)",
+}
+
+event.listen(
+    User.__table__,
+    'before_create',
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    .execute_if(dialect='postgresql'))
+
+for ddl in USER_SEARCH_INDEXES.values():
+    event.listen(
+        User.__table__,
+        'after_create',
+        DDL(ddl).execute_if(dialect='postgresql'))
+
+
+class utcnow(FunctionElement):
+    """The current UTC time, as the database sees it."""
+
+    type = db.DateTime()
+    inherit_cache = True
+
+
+@compiles(utcnow)
+def compile_utcnow(element, compiler, **kw):
+    # SQLite keeps datetimes as text, which is compared as text, so this
+    # must match how SQLAlchemy writes the values it binds (microseconds
+    # included) or equal times won't compare equal. 'now' is UTC.
+    return "STRFTIME('%Y-%m-%d %H:%M:%f000', 'now')"
+
+
+@compiles(utcnow, 'postgresql')
+def compile_utcnow_postgresql(element, compiler, **kw):
+    return "TIMEZONE('utc', CURRENT_TIMESTAMP)"
+
+
 class Message(db.Model):
-    """An individual message ("warble")."""
+    """An individual message ("warble").
+
+    Messages are ordered by (timestamp, id): the database stamps each one
+    as it's inserted, and the serial id, which only ever increases, breaks
+    ties between messages inserted in the same transaction.
+    """
 
     __tablename__ = 'messages'
+    # Fetch the server-side timestamp with RETURNING as soon as a message
+    # is inserted, since fan_out needs it straight away.
+    __mapper_args__ = {'eager_defaults': True}
 
     id = db.Column(
         db.Integer,
@@ -205,7 +704,7 @@ class Message(db.Model):
     timestamp = db.Column(
         db.DateTime,
         nullable=False,
-        default=datetime.utcnow(),
+        server_default=utcnow(),
     )
 
     user_id = db.Column(
@@ -214,7 +713,325 @@ class Message(db.Model):
         nullable=False,
     )
 
-    user = db.relationship('User')
+    # Denormalized count of likes, kept up to date by the like routes
+    # (see bump_likes) and recomputed by User.reconcile_counts.
+    likes_count = db.Column(
+        db.Integer,
+        nullable=False,
+        default=0,
+        server_default='0',
+    )
+
+    user = db.relationship(
+        'User',
+        back_populates='messages',
+        lazy=MESSAGE_USER_LOADING,
+    )
+
+    @classmethod
+    def bump_likes(cls, message_ids, delta=1):
+        """Add `delta` to the like counter of every message in `message_ids`
+        (a list of ids or a select of ids), as one atomic UPDATE."""
+
+        db.session.execute(
+            cls.__table__.update()
+            .where(cls.id.in_(message_ids))
+            .values({cls.likes_count: cls.likes_count + delta}))
+
+    @classmethod
+    def delete_references(cls, message_ids):
+        """Delete the likes and timeline entries of the messages in
+        `message_ids` (a list of ids or a select of ids). Call this before
+        deleting messages: once the table is partitioned there are no
+        foreign keys to cascade the deletes (see partitions.py)."""
+
+        db.session.execute(
+            Likes.__table__.delete().where(Likes.message_id.in_(message_ids)))
+        db.session.execute(
+            TimelineEntry.__table__.delete()
+            .where(TimelineEntry.message_id.in_(message_ids)))
+
+    @classmethod
+    def query_columns(cls, columns=None):
+        """A query for whole Messages, or for rows of just `columns` (which
+        may include User columns, for the author) when given."""
+
+        if columns is None:
+            return cls.query
+
+        query = db.session.query(*columns).select_from(cls)
+        if any(column.table is User.__table__ for column in columns):
+            query = query.join(User, User.id == cls.user_id)
+        return query
+
+    @classmethod
+    def get_with_user(cls, message_id):
+        """Message `message_id` and its author in one query, or None."""
+
+        return (cls.query
+                .options(joinedload(cls.user))
+                .filter(cls.id == message_id)
+                .first())
+
+    @classmethod
+    def for_user(cls, user_id, before=None, per_page=100, columns=None):
+        """A page of the messages written by `user_id`, newest first; just
+        `columns` of them if given (see query_columns), which must include
+        Message.id and Message.timestamp.
+
+        Returns (messages, next_cursor); see pagination.keyset_page.
+        """
+
+        query = cls.query_columns(columns).filter(cls.user_id == user_id)
+
+        return keyset_page(query, cls.timestamp, cls.id, before, per_page)
+
+
+# Newest-first scans of one user's messages (profiles, backfilling
+# timelines) and of all messages.
+db.Index('ix_messages_user_id_timestamp',
+         Message.user_id, Message.timestamp.desc(), Message.id.desc())
+db.Index('ix_messages_timestamp_id', Message.timestamp.desc(), Message.id)
+
+
+class Recommendation(db.Model):
+    """A precomputed "who to follow" suggestion for a user; the table is
+    refilled by recommendations.refresh."""
+
+    __tablename__ = 'recommendations'
+
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey('users.id', ondelete='cascade'),
+        primary_key=True,
+    )
+
+    # 0 for the best suggestion
+    rank = db.Column(
+        db.Integer,
+        primary_key=True,
+        autoincrement=False,
+    )
+
+    recommended_id = db.Column(
+        db.Integer,
+        db.ForeignKey('users.id', ondelete='cascade'),
+        nullable=False,
+    )
+
+    # How many of the users `user_id` follows follow `recommended_id`
+    score = db.Column(
+        db.Integer,
+        nullable=False,
+    )
+
+    @classmethod
+    def cards_for(cls, user_id, limit=10):
+        """UserCards for `user_id`'s best suggestions, skipping anyone
+        they've followed since the last refresh."""
+
+        followed = (exists()
+                    .where(Follows.user_following_id == user_id)
+                    .where(Follows.user_being_followed_id == cls.recommended_id))
+
+        rows = (db.session
+                .query(*[getattr(User, field) for field in UserCard._fields])
+                .join(cls, cls.recommended_id == User.id)
+                .filter(cls.user_id == user_id, ~followed)
+                .order_by(cls.rank)
+                .limit(limit))
+
+        return [UserCard(*row) for row in rows]
+
+
+class TimelineEntry(db.Model):
+    """A message pushed into a user's precomputed home timeline.
+
+    Timelines are filled on write (see `fan_out`) so the homepage only
+    has to read one user's newest rows instead of sorting every message.
+    """
+
+    __tablename__ = 'timelines'
+    __table_args__ = (
+        # For deleting a message's entries (see Message.delete_references).
+        db.Index('ix_timelines_message_id', 'message_id'),
+    )
+
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey('users.id', ondelete='cascade'),
+        primary_key=True,
+    )
+
+    message_id = db.Column(
+        db.Integer,
+        db.ForeignKey('messages.id', ondelete='cascade'),
+        primary_key=True,
+    )
+
+    # Copied from the message so the timeline index alone gives the order.
+    timestamp = db.Column(
+        db.DateTime,
+        nullable=False,
+    )
+
+    @classmethod
+    def for_user(cls, user_id, before=None, per_page=100, columns=None):
+        """A page of `user_id`'s home timeline, newest first; just `columns`
+        of the messages if given (see Message.query_columns), which must
+        include Message.id and Message.timestamp.
+
+        Returns (messages, next_cursor); see pagination.keyset_page.
+        """
+
+        if columns is None:
+            query = Message.query.options(selectinload(Message.user))
+        else:
+            query = Message.query_columns(columns)
+
+        # Entries copy their message's timestamp; matching on it too lets
+        # Postgres look each message up in just one partition when
+        # messages is partitioned (see partitions.py).
+        query = (query
+                 .join(cls, and_(cls.message_id == Message.id,
+                                 cls.timestamp == Message.timestamp))
+                 .filter(cls.user_id == user_id))
+
+        return keyset_page(query, cls.timestamp, cls.message_id,
+                           before, per_page)
+
+    @classmethod
+    def fan_out(cls, message):
+        """Push a flushed `message` into the timelines of its author and
+        everyone following the author. (Not trimmed; see TIMELINE_LENGTH.)"""
+
+        followers = (select(Follows.user_following_id)
+                     .where(Follows.user_being_followed_id == message.user_id))
+
+        recipients = union_all(select(literal(message.user_id).label('user_id')),
+                               followers).subquery()
+
+        # The timestamp is copied from the messages row, not bound from
+        # Python, so the entries always equal it exactly.
+        db.session.execute(
+            cls.__table__.insert().from_select(
+                ['user_id', 'message_id', 'timestamp'],
+                select(recipients.c.user_id, Message.id, Message.timestamp)
+                .select_from(recipients)
+                .join(Message, Message.id == message.id)))
+
+    @classmethod
+    def backfill(cls, follower_id, followed_ids):
+        """Copy the recent messages of the users in `followed_ids` into the
+        timeline of `follower_id`, who has just started following them."""
+
+        recent = (select(literal(follower_id), Message.id, Message.timestamp)
+                  .where(Message.user_id.in_(followed_ids))
+                  .order_by(Message.timestamp.desc(), Message.id.desc())
+                  .limit(TIMELINE_LENGTH))
+
+        db.session.execute(
+            cls.__table__.insert().from_select(
+                ['user_id', 'message_id', 'timestamp'], recent))
+
+        cls.trim([follower_id])
+
+    @classmethod
+    def prune(cls, follower_id, followed_ids):
+        """Remove the messages of the users in `followed_ids` from the
+        timeline of `follower_id`, who has just stopped following them."""
+
+        db.session.execute(
+            cls.__table__.delete()
+            .where(cls.user_id == follower_id)
+            .where(cls.message_id.in_(
+                select(Message.id).where(Message.user_id.in_(followed_ids)))))
+
+    @classmethod
+    def trim(cls, user_ids):
+        """Keep only the newest TIMELINE_LENGTH entries of each timeline
+        in `user_ids` (a list of ids or a select of ids)."""
+
+        ranked = (select(cls.user_id,
+                         cls.message_id,
+                         func.row_number().over(
+                             partition_by=cls.user_id,
+                             order_by=(cls.timestamp.desc(),
+                                       cls.message_id.desc()),
+                         ).label('position'))
+                  .where(cls.user_id.in_(user_ids))
+                  .subquery())
+
+        overflow = (select(ranked.c.user_id, ranked.c.message_id)
+                    .where(ranked.c.position > TIMELINE_LENGTH))
+
+        db.session.execute(
+            cls.__table__.delete()
+            .where(tuple_(cls.user_id, cls.message_id).in_(overflow)))
+
+    @classmethod
+    def trim_all(cls, batch_users=TRIM_BATCH_USERS):
+        """Trim every timeline, `batch_users` users' at a time, committing
+        after each batch so no transaction holds locks for long."""
+
+        max_id = db.session.execute(select(func.max(User.id))).scalar() or 0
+
+        for start in range(0, max_id + 1, batch_users):
+            cls.trim(select(User.id)
+                     .where(User.id >= start, User.id < start + batch_users))
+            db.session.commit()
+
+    @classmethod
+    def rebuild(cls):
+        """Recompute every timeline from `messages` and `follows`.
+
+        Used after bulk loads (e.g. seed.py), which bypass `fan_out`.
+        """
+
+        own = select(Message.user_id.label('user_id'),
+                     Message.id.label('message_id'),
+                     Message.timestamp.label('timestamp'))
+
+        followed = (select(Follows.user_following_id,
+                           Message.id,
+                           Message.timestamp)
+                    .join(Message,
+                          Message.user_id == Follows.user_being_followed_id))
+
+        pairs = union_all(own, followed).subquery()
+
+        ranked = (select(pairs.c.user_id,
+                         pairs.c.message_id,
+                         pairs.c.timestamp,
+                         func.row_number().over(
+                             partition_by=pairs.c.user_id,
+                             order_by=(pairs.c.timestamp.desc(),
+                                       pairs.c.message_id.desc()),
+                         ).label('position'))
+                  .subquery())
+
+        db.session.execute(cls.__table__.delete())
+        db.session.execute(
+            cls.__table__.insert().from_select(
+                ['user_id', 'message_id', 'timestamp'],
+                select(ranked.c.user_id, ranked.c.message_id, ranked.c.timestamp)
+                .where(ranked.c.position <= TIMELINE_LENGTH)))
+
+
+# Pages of one user's timeline, in keyset order (see for_user).
+db.Index('ix_timelines_user_id_timestamp_message_id',
+         TimelineEntry.user_id, TimelineEntry.timestamp.desc(),
+         TimelineEntry.message_id.desc())
+
+
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    """SQLite ignores foreign keys, so ON DELETE CASCADE too, unless
+    they're switched on for each connection."""
+
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
 
 
 def connect_db(app):
@@ -224,4 +1041,16 @@ def connect_db(app):
     """
 
     db.app = app
+    replica_router.init_app(app)
     db.init_app(app)
+
+    # On every engine: the primary and any replicas.
+    if not event.contains(Engine, 'connect', enable_sqlite_foreign_keys):
+        event.listen(Engine, 'connect', enable_sqlite_foreign_keys)
+
+    hasher.configure(
+        rounds=app.config.get('BCRYPT_LOG_ROUNDS', 12),
+        workers=app.config.get('HASHING_WORKERS'),
+        max_pending=app.config.get('HASHING_MAX_PENDING'),
+        timeout=app.config.get('HASHING_TIMEOUT', 5),
+    )
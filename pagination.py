@@ -0,0 +1,59 @@
+"""Keyset (cursor) pagination for Warbler timelines.
+
+Pages are keyed on (timestamp, id) rather than OFFSET, so every page is a
+single index range scan no matter how far back the user has scrolled.
+"""
+
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+
+def encode_cursor(timestamp, id):
+    """Turn the key of the last row on a page into an opaque cursor."""
+
+    raw = f"{timestamp.isoformat()}|{id}".encode('UTF-8')
+    return urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Turn a cursor back into a (timestamp, id) key.
+
+    Returns None for an empty cursor; raises ValueError if it is garbage.
+    """
+
+    if not cursor:
+        return None
+
+    try:
+        raw = urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        timestamp, id = raw.decode('UTF-8').split('|')
+        return datetime.fromisoformat(timestamp), int(id)
+    except (TypeError, UnicodeDecodeError, ValueError) as exc:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from exc
+
+
+def keyset_page(query, timestamp_col, id_col, before=None, per_page=100):
+    """Fetch one page of `query`, newest first, strictly older than the
+    `before` key.
+
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+
+    if before:
+        # The plain timestamp bound is implied by the row comparison, but
+        # lets Postgres skip newer partitions of a partitioned table.
+        query = query.filter(timestamp_col <= before[0],
+                             tuple_(timestamp_col, id_col) < tuple_(*before))
+
+    rows = (query
+            .order_by(timestamp_col.desc(), id_col.desc())
+            .limit(per_page + 1)
+            .all())
+
+    if len(rows) <= per_page:
+        return rows, None
+
+    rows = rows[:per_page]
+    return rows, encode_cursor(rows[-1].timestamp, rows[-1].id)
@@ -0,0 +1,221 @@
+"""Monthly range partitioning of the messages table (Postgres only).
+
+Timelines only ever read the newest messages, so on big installs messages
+can be split into one partition per month of `timestamp`:
+
+    FLASK_APP=app flask partition-messages      # one-off conversion
+    FLASK_APP=app flask create-partitions       # from cron, e.g. daily
+    FLASK_APP=app flask archive-messages --retention-months 24 --to archive/
+    FLASK_APP=app flask restore-messages 2019-03 --from archive/
+
+Postgres needs the partition key in every unique constraint of a
+partitioned table, so the primary key becomes (id, timestamp). That means
+likes and timelines can no longer have foreign keys to messages: the
+conversion drops them, so deleting a message deletes its likes and
+timeline entries explicitly (Message.delete_references) rather than by
+cascade. Those of archived messages are kept.
+
+create-partitions keeps PARTITION_MONTHS_AHEAD months ready. Should it not
+run in time, messages for months without a partition go to a DEFAULT
+partition, messages_default, instead of failing to insert; they're moved
+into their month's partition when it is created.
+
+Archived partitions are detached, written to gzipped CSV files named like
+messages_p2019_03.csv.gz and dropped; restoring one re-creates and
+re-attaches it. Likes and timeline entries of archived messages are kept,
+so restored messages come back with them.
+"""
+
+import gzip
+import os
+import re
+from datetime import date
+
+from sqlalchemy import text
+
+PARTITION_MONTHS_AHEAD = 3
+
+PARTITION_NAME = re.compile(r'^messages_p(\d{4})_(\d{2})$')
+
+DEFAULT_PARTITION = 'messages_default'
+
+
+def add_months(month, count):
+    """The first day of the month `count` months after `month`."""
+
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"messages_p{month.year:04d}_{month.month:02d}"
+
+
+def is_partitioned(conn):
+    """Has the messages table been converted?"""
+
+    return bool(conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table "
+        "WHERE partrelid = 'messages'::regclass")).scalar())
+
+
+def partition_months(conn):
+    """First days of the months with a partition attached, oldest first."""
+
+    names = conn.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = 'messages'::regclass")).scalars()
+
+    months = []
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            months.append(date(int(match[1]), int(match[2]), 1))
+    return sorted(months)
+
+
+def attach_partition(conn, month):
+    """Attach the table for `month`'s partition, first moving into it any
+    of the month's messages that went to the default partition."""
+
+    name = partition_name(month)
+    start, end = month, add_months(month, 1)
+
+    # Tables converted before there was a default partition get one here.
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} "
+        f"PARTITION OF messages DEFAULT"))
+    conn.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+        f"WHERE timestamp >= '{start}' AND timestamp < '{end}' RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"))
+    conn.execute(text(
+        f"ALTER TABLE messages ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{start}') TO ('{end}')"))
+
+
+def create_partition(conn, month):
+    """Create and attach the partition for `month`, if it's missing."""
+
+    if month in partition_months(conn):
+        return
+
+    conn.execute(text(
+        f"CREATE TABLE {partition_name(month)} (LIKE messages INCLUDING DEFAULTS)"))
+    attach_partition(conn, month)
+
+
+def create_partitions(engine, months_ahead=PARTITION_MONTHS_AHEAD, today=None):
+    """Make sure this month and the next `months_ahead` have partitions."""
+
+    this_month = (today or date.today()).replace(day=1)
+
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            return
+
+        for i in range(months_ahead + 1):
+            create_partition(conn, add_months(this_month, i))
+
+
+def partition_messages(engine, months_ahead=PARTITION_MONTHS_AHEAD):
+    """Convert the messages table into monthly partitions, in one
+    transaction. The table is locked while its rows are copied."""
+
+    with engine.begin() as conn:
+        if is_partitioned(conn):
+            return
+
+        oldest = conn.execute(text(
+            "SELECT min(timestamp) FROM messages")).scalar()
+
+        for statement in [
+            "ALTER TABLE likes DROP CONSTRAINT IF EXISTS likes_message_id_fkey",
+            "ALTER TABLE timelines DROP CONSTRAINT IF EXISTS timelines_message_id_fkey",
+
+            # Move the old table, and its index names, out of the way.
+            "ALTER TABLE messages RENAME TO messages_unpartitioned",
+            "ALTER INDEX messages_pkey RENAME TO messages_unpartitioned_pkey",
+            "ALTER INDEX IF EXISTS ix_messages_user_id_timestamp "
+            "RENAME TO ix_messages_unpartitioned_user_id_timestamp",
+            "ALTER INDEX IF EXISTS ix_messages_timestamp_id "
+            "RENAME TO ix_messages_unpartitioned_timestamp_id",
+            "ALTER SEQUENCE messages_id_seq OWNED BY NONE",
+
+            "CREATE TABLE messages "
+            "(LIKE messages_unpartitioned INCLUDING DEFAULTS) "
+            "PARTITION BY RANGE (timestamp)",
+            "ALTER TABLE messages ADD CONSTRAINT messages_pkey "
+            "PRIMARY KEY (id, timestamp)",
+            "ALTER TABLE messages ADD CONSTRAINT messages_user_id_fkey "
+            "FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE",
+            "CREATE INDEX ix_messages_user_id_timestamp "
+            "ON messages (user_id, timestamp DESC, id DESC)",
+            "CREATE INDEX ix_messages_timestamp_id "
+            "ON messages (timestamp DESC, id)",
+        ]:
+            conn.execute(text(statement))
+
+        month = (oldest.date() if oldest else date.today()).replace(day=1)
+        last = add_months(date.today().replace(day=1), months_ahead)
+        while month <= last:
+            create_partition(conn, month)
+            month = add_months(month, 1)
+
+        conn.execute(text(
+            "INSERT INTO messages SELECT * FROM messages_unpartitioned"))
+        conn.execute(text("DROP TABLE messages_unpartitioned"))
+        conn.execute(text("ALTER SEQUENCE messages_id_seq OWNED BY messages.id"))
+
+
+def archive_path(directory, month):
+    return os.path.join(directory, f"{partition_name(month)}.csv.gz")
+
+
+def archive_partitions(engine, retention_months, directory, today=None):
+    """Detach the partitions of months that ended more than
+    `retention_months` ago, write each to a gzipped CSV in `directory`,
+    then drop it. Returns the months archived."""
+
+    cutoff = add_months((today or date.today()).replace(day=1),
+                        -retention_months)
+    os.makedirs(directory, exist_ok=True)
+    archived = []
+
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            return archived
+
+        for month in partition_months(conn):
+            if add_months(month, 1) > cutoff:
+                continue
+
+            name = partition_name(month)
+            conn.execute(text(f"ALTER TABLE messages DETACH PARTITION {name}"))
+
+            path = archive_path(directory, month)
+            with gzip.open(path, 'wt', newline='') as f:
+                conn.connection.cursor().copy_expert(
+                    f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)", f)
+
+            conn.execute(text(f"DROP TABLE {name}"))
+            archived.append(month)
+
+    return archived
+
+
+def restore_partition(engine, month, directory):
+    """Re-create and re-attach `month`'s partition from its archive file."""
+
+    name = partition_name(month)
+
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"CREATE TABLE {name} (LIKE messages INCLUDING DEFAULTS)"))
+
+        with gzip.open(archive_path(directory, month), 'rt', newline='') as f:
+            conn.connection.cursor().copy_expert(
+                f"COPY {name} FROM STDIN WITH (FORMAT csv, HEADER)", f)
+
+        attach_partition(conn, month)
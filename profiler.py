@@ -0,0 +1,150 @@
+"""Lightweight per-request SQL profiler for Warbler.
+
+Hooks SQLAlchemy's engine events to count the statements each sampled
+request runs and the time spent in the database, groups statements by a
+fingerprint of their shape, and flags likely N+1 patterns (one shape run
+many times in a request). Requests over budget get a structured log line
+and an `X-SQL-Profile` response header.
+
+Unsampled requests only pay for a `random()` call and a `g` lookup per
+statement, so the sample rate controls the overhead.
+"""
+
+import hashlib
+import json
+import re
+from collections import Counter
+from random import random
+from time import perf_counter
+
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Collapse literals and expanded IN lists so that statements differing
+# only in their values share a fingerprint.
+PLACEHOLDER_LISTS = re.compile(r'\(\s*(?:%\(\w+\)s|\?|:\w+|[\d.]+|\'[^\']*\')'
+                               r'(?:\s*,\s*(?:%\(\w+\)s|\?|:\w+|[\d.]+|\'[^\']*\'))*\s*\)')
+LITERALS = re.compile(r"'[^']*'|\b\d+(?:\.\d+)?\b")
+WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint(statement):
+    """Short stable id for the shape of a SQL statement."""
+
+    shape = PLACEHOLDER_LISTS.sub('(?)', statement)
+    shape = LITERALS.sub('?', shape)
+    shape = WHITESPACE.sub(' ', shape).strip()
+    return hashlib.sha1(shape.encode('UTF-8')).hexdigest()[:12]
+
+
+class RequestProfile:
+    """The statements run during one request."""
+
+    def __init__(self):
+        self.query_count = 0
+        self.db_time = 0.0
+        self.shapes = Counter()
+        self.examples = {}
+
+    def record(self, statement, duration):
+        """Add one executed statement that took `duration` seconds."""
+
+        shape = fingerprint(statement)
+        self.query_count += 1
+        self.db_time += duration
+        self.shapes[shape] += 1
+        self.examples.setdefault(shape, statement)
+
+    def repeated(self, threshold):
+        """{fingerprint: count} for shapes run more than `threshold` times."""
+
+        return {shape: count for shape, count in self.shapes.items()
+                if count > threshold}
+
+
+class SQLProfiler:
+    """Flask extension profiling the SQL of a sample of requests.
+
+    Config:
+      SQL_PROFILER_SAMPLE_RATE - fraction of requests profiled (0 disables)
+      SQL_PROFILER_MAX_QUERIES - statement budget per request
+      SQL_PROFILER_MAX_DB_MS - database time budget per request
+      SQL_PROFILER_N_PLUS_ONE - repeats of one shape that count as N+1
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SQL_PROFILER_SAMPLE_RATE', 0.0)
+        app.config.setdefault('SQL_PROFILER_MAX_QUERIES', 20)
+        app.config.setdefault('SQL_PROFILER_MAX_DB_MS', 100.0)
+        app.config.setdefault('SQL_PROFILER_N_PLUS_ONE', 10)
+
+        self.app = app
+        app.before_request(self.start)
+        app.after_request(self.finish)
+
+        event.listen(Engine, 'before_cursor_execute', self.before_execute)
+        event.listen(Engine, 'after_cursor_execute', self.after_execute)
+
+    @staticmethod
+    def current():
+        """The RequestProfile of the current request, if it is sampled."""
+
+        return g.get('sql_profile') if has_app_context() else None
+
+    def start(self):
+        if random() < self.app.config['SQL_PROFILER_SAMPLE_RATE']:
+            g.sql_profile = RequestProfile()
+
+    def before_execute(self, conn, cursor, statement, parameters,
+                       context, executemany):
+        if self.current() is not None:
+            conn.info.setdefault('sql_profiler_start', []).append(perf_counter())
+
+    def after_execute(self, conn, cursor, statement, parameters,
+                      context, executemany):
+        profile = self.current()
+        starts = conn.info.get('sql_profiler_start')
+        if profile is not None and starts:
+            profile.record(statement, perf_counter() - starts.pop())
+
+    def finish(self, response):
+        profile = self.current()
+        if profile is None:
+            return response
+
+        config = self.app.config
+        db_ms = profile.db_time * 1000
+        repeated = profile.repeated(config['SQL_PROFILER_N_PLUS_ONE'])
+
+        if (profile.query_count <= config['SQL_PROFILER_MAX_QUERIES']
+                and db_ms <= config['SQL_PROFILER_MAX_DB_MS']
+                and not repeated):
+            return response
+
+        self.app.logger.warning(json.dumps({
+            'event': 'sql_profile',
+            'endpoint': request.endpoint,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': profile.query_count,
+            'db_ms': round(db_ms, 2),
+            'n_plus_one': [
+                {'fingerprint': shape,
+                 'count': count,
+                 'statement': profile.examples[shape]}
+                for shape, count in repeated.items()
+            ],
+        }))
+
+        header = f"queries={profile.query_count}; db_ms={db_ms:.2f}"
+        if repeated:
+            header += "; n_plus_one=" + ",".join(repeated)
+        response.headers['X-SQL-Profile'] = header
+
+        return response
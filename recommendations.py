@@ -0,0 +1,192 @@
+""""Who to follow" suggestions from friends of friends.
+
+`refresh` loads the whole follows table into a FollowGraph, a compressed
+sparse row (CSR) adjacency matrix in which row i lists the users that
+user i follows. Sparse matrix products then score every user's candidates
+at once: (A @ A)[i, j] is how many of the people user i follows follow
+user j. Users i already follows (and i themself) are dropped, and the top
+K for each user are written to the recommendations table, which is all
+the app reads at request time.
+
+Run it periodically, e.g. nightly from cron:
+
+    FLASK_APP=app flask refresh-recommendations
+
+NumPy and SciPy are only needed here, not by the web app.
+"""
+
+import io
+from itertools import chain
+from time import perf_counter
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import func, select
+
+from models import Follows, Recommendation, User
+
+TOP_K = 10
+
+# Rows of A @ A are computed a block of users at a time, each block
+# covering about this many two-step follow paths, which bounds memory
+# however skewed the graph is.
+BLOCK_PATHS = 20_000_000
+
+# Follows fetched per round trip when loading the graph.
+LOAD_CHUNK_ROWS = 1_000_000
+
+
+class FollowGraph:
+    """Follows as a CSR matrix; row i holds the ids of who user i follows."""
+
+    def __init__(self, matrix):
+        self.matrix = matrix
+
+    @classmethod
+    def from_edges(cls, follower_ids, followed_ids, num_users=None):
+        """Graph of the follows `follower_ids[n]` -> `followed_ids[n]`, for
+        user ids 0 .. num_users - 1 (by default, up to the highest id)."""
+
+        follower_ids = np.asarray(follower_ids, dtype=np.int32)
+        followed_ids = np.asarray(followed_ids, dtype=np.int32)
+
+        # A self-follow would make top_suggestions' masking of the user
+        # themself subtract from scores, so leave any out.
+        not_self = follower_ids != followed_ids
+        follower_ids = follower_ids[not_self]
+        followed_ids = followed_ids[not_self]
+
+        if num_users is None:
+            num_users = int(max(follower_ids.max(initial=-1),
+                                followed_ids.max(initial=-1))) + 1
+
+        ones = np.ones(len(follower_ids), dtype=np.int32)
+        matrix = sparse.csr_matrix((ones, (follower_ids, followed_ids)),
+                                   shape=(num_users, num_users))
+        matrix.sum_duplicates()  # also sorts each row's ids
+        return cls(matrix)
+
+    @classmethod
+    def load(cls, conn, chunk_rows=LOAD_CHUNK_ROWS):
+        """Read the follows table over `conn`, streaming it in chunks."""
+
+        num_users = (conn.execute(select(func.max(User.id))).scalar() or 0) + 1
+
+        result = (conn
+                  .execution_options(stream_results=True)
+                  .execute(select(Follows.user_following_id,
+                                  Follows.user_being_followed_id)))
+
+        chunks = [np.fromiter(chain.from_iterable(rows), dtype=np.int32,
+                              count=2 * len(rows)).reshape(-1, 2)
+                  for rows in result.partitions(chunk_rows)]
+        edges = (np.concatenate(chunks) if chunks
+                 else np.empty((0, 2), dtype=np.int32))
+
+        return cls.from_edges(edges[:, 0], edges[:, 1], num_users)
+
+    @property
+    def num_follows(self):
+        return self.matrix.nnz
+
+    @property
+    def nbytes(self):
+        """Memory held by the matrix's arrays."""
+
+        matrix = self.matrix
+        return matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+
+
+def blocks(graph, max_paths=BLOCK_PATHS):
+    """(start, stop) ranges of user ids covering about `max_paths` two-step
+    follow paths each (a user with more gets a block of their own)."""
+
+    matrix = graph.matrix
+    out_degrees = np.diff(matrix.indptr).astype(np.int64)
+    paths = np.cumsum(matrix @ out_degrees)
+
+    start = 0
+    while start < len(paths):
+        done = paths[start - 1] if start else 0
+        stop = int(np.searchsorted(paths, done + max_paths, side='right'))
+        stop = max(stop, start + 1)
+        yield start, stop
+        start = stop
+
+
+def top_suggestions(graph, k=TOP_K, max_paths=BLOCK_PATHS):
+    """Each user's top `k` suggestions, yielded a block of users at a time
+    as arrays (user_ids, suggested_ids, scores, ranks).
+
+    A suggestion's score is how many of the people the user follows follow
+    it; ties go to the lower id. Rank 0 is the best suggestion.
+    """
+
+    matrix = graph.matrix
+    num_users = matrix.shape[0]
+
+    for start, stop in blocks(graph, max_paths):
+        following = matrix[start:stop]
+        scores = following @ matrix
+
+        # Drop users they already follow, and themselves.
+        followed_or_self = following + sparse.eye(
+            stop - start, num_users, k=start, dtype=np.int32, format='csr')
+        scores = scores - scores.multiply(followed_or_self)
+        scores.eliminate_zeros()
+
+        counts = np.diff(scores.indptr)
+        rows = np.repeat(np.arange(stop - start), counts)
+
+        # Order each row best first, then rank within the row.
+        order = np.lexsort((scores.indices, -scores.data, rows))
+        ranks = np.arange(len(order)) - np.repeat(scores.indptr[:-1], counts)
+        keep = ranks < k
+
+        yield (start + rows[keep],
+               scores.indices[order][keep],
+               scores.data[order][keep],
+               ranks[keep])
+
+
+def insert_suggestions(conn, columns):
+    """Write rows of (user_id, recommended_id, score, rank) `columns`."""
+
+    table = Recommendation.__table__
+    names = ['user_id', 'recommended_id', 'score', 'rank']
+    rows = np.column_stack(columns)
+
+    if conn.dialect.name == 'postgresql':
+        buffer = io.StringIO()
+        np.savetxt(buffer, rows, fmt='%d', delimiter=',')
+        buffer.seek(0)
+        conn.connection.cursor().copy_expert(
+            f"COPY {table.name} ({', '.join(names)}) "
+            f"FROM STDIN WITH (FORMAT csv)", buffer)
+    elif len(rows):
+        conn.execute(table.insert(),
+                     [dict(zip(names, row)) for row in rows.tolist()])
+
+
+def refresh(engine, k=TOP_K, max_paths=BLOCK_PATHS):
+    """Recompute every user's suggestions, replacing the recommendations
+    table in one transaction. Returns stats about the run."""
+
+    with engine.begin() as conn:
+        start = perf_counter()
+        graph = FollowGraph.load(conn)
+        loaded = perf_counter()
+
+        conn.execute(Recommendation.__table__.delete())
+        suggestions = 0
+        for columns in top_suggestions(graph, k, max_paths):
+            insert_suggestions(conn, columns)
+            suggestions += len(columns[0])
+
+    return {
+        'follows': graph.num_follows,
+        'graph_mb': round(graph.nbytes / 2**20, 1),
+        'suggestions': suggestions,
+        'load_seconds': round(loaded - start, 2),
+        'compute_seconds': round(perf_counter() - loaded, 2),
+    }
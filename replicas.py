@@ -0,0 +1,143 @@
+"""Read-replica routing for Warbler's database session.
+
+Read-only requests (GET/HEAD) run their queries on one of the replica
+databases in SQLALCHEMY_REPLICA_URIS, picked round-robin among those that
+pass a periodic health check. Everything else uses the primary: other
+requests, flushes and INSERT/UPDATE/DELETE statements, and work outside a
+request such as CLI commands and seeding.
+
+A replica can lag behind the primary, so after a request that may have
+written anything the client is pinned to the primary for
+REPLICA_PIN_SECONDS and sees its own writes.
+
+To try it locally, point DATABASE_REPLICA_URLS at a copy of the database,
+e.g. two SQLite files or a second Postgres database.
+"""
+
+import logging
+from itertools import count
+from threading import Lock
+from time import monotonic, time
+
+from flask import g, has_app_context, request, session
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import orm, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.sql.dml import UpdateBase
+
+logger = logging.getLogger(__name__)
+
+READ_METHODS = {'GET', 'HEAD'}
+
+# Session key with the time until which the client reads from the primary.
+PINNED_UNTIL_KEY = 'db_pinned_until'
+
+
+class RoutingSession(SignallingSession):
+    """Session that sends reads to the replica chosen for the request."""
+
+    def get_bind(self, mapper=None, clause=None):
+        replica = g.get('replica_engine') if has_app_context() else None
+
+        if (replica is None or self._flushing
+                or isinstance(clause, UpdateBase)):
+            return super().get_bind(mapper, clause)
+
+        return replica
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy whose sessions are RoutingSessions."""
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+class Replica:
+    """Health of one replica bind, as of its last check."""
+
+    def __init__(self, bind_key):
+        self.bind_key = bind_key
+        self.healthy = True
+        self.checked_at = None
+
+
+class ReplicaRouter:
+    """Picks the database each request reads from."""
+
+    def __init__(self, db):
+        self.db = db
+        self.replicas = []
+        self.pin_seconds = 5
+        self.health_interval = 10
+        self._turn = count()
+        self._lock = Lock()
+
+    def init_app(self, app):
+        """Add the app's replicas as binds and route its requests."""
+
+        uris = app.config.get('SQLALCHEMY_REPLICA_URIS') or []
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        for i, uri in enumerate(uris):
+            binds[f'replica{i}'] = uri
+        app.config['SQLALCHEMY_BINDS'] = binds
+
+        self.replicas = [Replica(f'replica{i}') for i in range(len(uris))]
+        self.pin_seconds = app.config.get('REPLICA_PIN_SECONDS', 5)
+        self.health_interval = app.config.get('REPLICA_HEALTH_INTERVAL', 10)
+
+        app.before_request(self.route_request)
+        app.after_request(self.pin_after_write)
+
+    def route_request(self):
+        """Choose a replica for a read-only request from an unpinned client."""
+
+        g.replica_engine = None
+
+        if (request.method in READ_METHODS
+                and session.get(PINNED_UNTIL_KEY, 0) <= time()):
+            g.replica_engine = self.pick()
+
+    def pin_after_write(self, response):
+        """Keep the client on the primary for a while after a write."""
+
+        if request.method not in READ_METHODS and response.status_code < 400:
+            session[PINNED_UNTIL_KEY] = time() + self.pin_seconds
+        return response
+
+    def pick(self):
+        """Engine of the next healthy replica, round-robin; None if there
+        are none (so the primary is used)."""
+
+        for _ in range(len(self.replicas)):
+            replica = self.replicas[next(self._turn) % len(self.replicas)]
+            if self.is_healthy(replica):
+                return self.db.get_engine(bind=replica.bind_key)
+
+        return None
+
+    def is_healthy(self, replica):
+        """Did `replica` answer a SELECT 1 at its last check? Checks again
+        once every `health_interval` seconds."""
+
+        now = monotonic()
+
+        with self._lock:
+            due = (replica.checked_at is None
+                   or now - replica.checked_at >= self.health_interval)
+            if due:
+                replica.checked_at = now
+
+        if due:
+            try:
+                with self.db.get_engine(bind=replica.bind_key).connect() as conn:
+                    conn.execute(text('SELECT 1'))
+            except DBAPIError:
+                if replica.healthy:
+                    logger.warning("Replica %s failed its health check",
+                                   replica.bind_key, exc_info=True)
+                replica.healthy = False
+            else:
+                replica.healthy = True
+
+        return replica.healthy
@@ -1,20 +1,28 @@
 """Seed database with sample data from CSV Files."""
 
-from csv import DictReader
 from app import db
-from models import User, Message, Follows
+from bulk_load import load_csvs
+from models import User, TimelineEntry
 
 
-db.drop_all()
-db.create_all()
+def seed(directory='generator', **kwargs):
+    """Recreate the tables and load the CSVs in `directory` into them.
 
-with open('generator/users.csv') as users:
-    db.session.bulk_insert_mappings(User, DictReader(users))
+    Extra keyword arguments are passed on to bulk_load.load_csvs.
+    """
 
-with open('generator/messages.csv') as messages:
-    db.session.bulk_insert_mappings(Message, DictReader(messages))
+    # Don't let an open session transaction block dropping the tables.
+    db.session.close()
 
-with open('generator/follows.csv') as follows:
-    db.session.bulk_insert_mappings(Follows, DictReader(follows))
+    load_csvs(db.engine, directory, **kwargs)
 
-db.session.commit()
+    # Bulk inserts skip the fan-out and counters kept by the routes, so fill
+    # timelines and counters here.
+    TimelineEntry.rebuild()
+    User.reconcile_counts()
+
+    db.session.commit()
+
+
+if __name__ == '__main__':
+    seed()
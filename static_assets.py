@@ -0,0 +1,236 @@
+"""Fingerprinted, precompressed static files for Warbler.
+
+A build step copies everything under static/ into the assets directory
+under names that include a hash of the file's contents, e.g.
+
+    stylesheets/style.css -> stylesheets/style.5d41402abc4b.css
+
+alongside gzip (.gz) and, when the brotli package is installed, brotli
+(.br) variants of text files, and a manifest.json mapping one to the other:
+
+    FLASK_APP=app flask build-assets
+
+Since a file's URL changes whenever its contents do, the app can tell
+browsers to cache them for a year without revalidating. Templates keep
+calling url_for('static', filename=...); with a manifest loaded that
+returns the fingerprinted URL, without one (e.g. in development) the plain
+/static URL.
+
+Old builds' files are left in place, so pages cached before a deploy can
+still load the assets they refer to. Restart the app after building.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+
+from flask import abort, request, send_from_directory, url_for as flask_url_for
+from werkzeug.utils import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MANIFEST = 'manifest.json'
+
+# Hex digits of the content hash put in file names.
+HASH_LENGTH = 12
+
+ONE_YEAR = 365 * 24 * 60 * 60
+
+# Files worth compressing; images like PNG and JPEG already are.
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.json', '.map', '.svg', '.txt',
+                           '.ico'}
+
+# Content-Encodings we precompress for, most preferred first, and the
+# suffix of their files.
+ENCODINGS = {'br': '.br', 'gzip': '.gz'}
+
+# Names of fingerprinted files (see `fingerprint`).
+FINGERPRINTED = re.compile(rf'\.[0-9a-f]{{{HASH_LENGTH}}}(\.[^./]+)?$')
+
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+
+def fingerprint(name, data):
+    """`name` with a hash of `data` inserted before its extension."""
+
+    base, ext = posixpath.splitext(name)
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    return f"{base}.{digest}{ext}"
+
+
+def compress(data):
+    """{encoding: compressed bytes} for the encodings that make `data`
+    smaller."""
+
+    variants = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli:
+        variants['br'] = brotli.compress(data, quality=11)
+
+    return {encoding: compressed for encoding, compressed in variants.items()
+            if len(compressed) < len(data)}
+
+
+def rewrite_css_urls(css, name, paths, static_url_path):
+    """Point the url()s in stylesheet `name` at fingerprinted files, using
+    URLs relative to the stylesheet's own fingerprinted location."""
+
+    directory = posixpath.dirname(name)
+
+    def replace(match):
+        quote, url = match.groups()
+        if url.startswith(static_url_path + '/'):
+            target = url[len(static_url_path) + 1:]
+        elif ':' in url or url.startswith('/'):
+            return match.group(0)  # another site, or a data: URL
+        else:
+            target = posixpath.normpath(posixpath.join(directory, url))
+
+        if target not in paths:
+            return match.group(0)
+
+        relative = posixpath.relpath(paths[target], directory or '.')
+        return f"url({quote}{relative}{quote})"
+
+    return CSS_URL.sub(replace, css.decode('UTF-8')).encode('UTF-8')
+
+
+def write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def build(source_dir, output_dir, static_url_path='/static'):
+    """Fingerprint and compress every file in `source_dir` into
+    `output_dir`, then write the manifest. Returns the manifest's files."""
+
+    names = sorted(
+        posixpath.join(*os.path.relpath(os.path.join(root, filename),
+                                        source_dir).split(os.sep))
+        for root, _, filenames in os.walk(source_dir)
+        for filename in filenames)
+
+    # Stylesheets refer to other files, so need their names first.
+    names.sort(key=lambda name: name.endswith('.css'))
+
+    files = {}
+    paths = {}
+    for name in names:
+        with open(os.path.join(source_dir, name), 'rb') as f:
+            data = f.read()
+
+        if name.endswith('.css'):
+            data = rewrite_css_urls(data, name, paths, static_url_path)
+
+        path = paths[name] = fingerprint(name, data)
+        write_file(os.path.join(output_dir, path), data)
+
+        encodings = []
+        if posixpath.splitext(name)[1] in COMPRESSIBLE_EXTENSIONS:
+            for encoding, compressed in compress(data).items():
+                write_file(os.path.join(output_dir, path + ENCODINGS[encoding]),
+                           compressed)
+                encodings.append(encoding)
+
+        files[name] = {'path': path, 'encodings': encodings}
+
+    manifest = {
+        'version': hashlib.sha256(json.dumps(files, sort_keys=True)
+                                  .encode('UTF-8')).hexdigest()[:HASH_LENGTH],
+        'files': files,
+    }
+
+    # Written last, and replaced in one step, so a half-finished build is
+    # never loaded.
+    manifest_path = os.path.join(output_dir, MANIFEST)
+    write_file(manifest_path + '.tmp', json.dumps(manifest, indent=2).encode('UTF-8'))
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+    return files
+
+
+class StaticAssets:
+    """Serves a build's fingerprinted files at ASSETS_URL_PATH, and makes
+    templates' url_for('static', ...) point at them."""
+
+    def __init__(self, app=None):
+        self.directory = None
+        self.version = None
+        self.files = {}
+
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ASSETS_DIR', os.path.join(app.root_path, 'assets'))
+        app.config.setdefault('ASSETS_URL_PATH', '/assets')
+
+        self.directory = app.config['ASSETS_DIR']
+        self.load()
+
+        app.add_url_rule(app.config['ASSETS_URL_PATH'] + '/<path:filename>',
+                         'assets', self.send)
+        app.jinja_env.globals['url_for'] = self.url_for
+
+    def load(self):
+        """Read the build's manifest, if there is one."""
+
+        try:
+            with open(os.path.join(self.directory, MANIFEST)) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return
+
+        self.version = manifest['version']
+        self.files = manifest['files']
+
+    def url_for(self, endpoint, **values):
+        """flask.url_for, but static files with a fingerprinted copy get
+        its URL instead."""
+
+        if endpoint == 'static' and values.get('filename') in self.files:
+            endpoint = 'assets'
+            values['filename'] = self.files[values['filename']]['path']
+
+        return flask_url_for(endpoint, **values)
+
+    def encoding_for(self, path):
+        """The precompressed variant of the file at `path` to send, or None."""
+
+        for encoding, suffix in ENCODINGS.items():
+            if (request.accept_encodings[encoding]
+                    and os.path.isfile(path + suffix)):
+                return encoding
+        return None
+
+    def send(self, filename):
+        # Any build's files, not just the current manifest's, so pages
+        # cached before a deploy still get the assets they link to.
+        path = safe_join(self.directory, filename)
+        if (not FINGERPRINTED.search(filename)
+                or path is None or not os.path.isfile(path)):
+            abort(404)
+
+        encoding = self.encoding_for(path)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+        if encoding:
+            response = send_from_directory(
+                self.directory, filename + ENCODINGS[encoding],
+                mimetype=mimetype, max_age=ONE_YEAR)
+            response.content_encoding = encoding
+        else:
+            response = send_from_directory(self.directory, filename,
+                                           mimetype=mimetype, max_age=ONE_YEAR)
+
+        response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = (
+            f"public, max-age={ONE_YEAR}, immutable")
+        return response
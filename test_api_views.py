@@ -0,0 +1,111 @@
+"""JSON API view tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_api_views.py
+
+
+import os
+from unittest import TestCase
+
+from models import db, Message, User, Follows, TimelineEntry
+
+os.environ['DATABASE_URL'] = "postgresql:///warbler-test"
+
+from app import app, CURR_USER_KEY
+
+db.create_all()
+
+
+class ApiViewTestCase(TestCase):
+    """Test views for the JSON API."""
+
+    def setUp(self):
+        """Create test client, add sample data."""
+
+        User.query.delete()
+        Message.query.delete()
+        Follows.query.delete()
+
+        self.client = app.test_client()
+
+        self.author = User.signup(username="author",
+                                  email="author@test.com",
+                                  password="password",
+                                  image_url=None)
+        self.reader = User.signup(username="reader",
+                                  email="reader@test.com",
+                                  password="password",
+                                  image_url=None)
+        db.session.commit()
+
+        db.session.add(Follows(user_being_followed_id=self.author.id,
+                               user_following_id=self.reader.id))
+        for i in range(3):
+            msg = Message(text=f"Message {i}", user_id=self.author.id)
+            db.session.add(msg)
+            db.session.flush()
+            TimelineEntry.fan_out(msg)
+        db.session.commit()
+
+        self.author_id = self.author.id
+        self.reader_id = self.reader.id
+
+    def login(self, user_id):
+        with self.client.session_transaction() as sess:
+            sess[CURR_USER_KEY] = user_id
+
+    def test_timeline_fields(self):
+        """Does ?fields= pick what each timeline item has, and does the
+        timeline page with its cursor?"""
+
+        self.login(self.reader_id)
+
+        resp = self.client.get("/api/timeline?fields=text,username&per_page=2")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json['items'], [
+            {'text': "Message 2", 'username': "author"},
+            {'text': "Message 1", 'username': "author"},
+        ])
+
+        resp = self.client.get(
+            f"/api/timeline?fields=text&per_page=2&before={resp.json['next']}")
+        self.assertEqual(resp.json, {'items': [{'text': "Message 0"}],
+                                     'next': None})
+
+    def test_timeline_anonymous(self):
+        """Is the home timeline only for logged-in users?"""
+
+        resp = self.client.get("/api/timeline")
+        self.assertEqual(resp.status_code, 401)
+
+    def test_unknown_field(self):
+        """Are unknown fields rejected?"""
+
+        resp = self.client.get(
+            f"/api/users/{self.author_id}/messages?fields=text,password")
+        self.assertEqual(resp.status_code, 400)
+
+    def test_message(self):
+        """Is a single message returned with all fields by default?"""
+
+        msg = Message.query.filter_by(text="Message 0").one()
+
+        resp = self.client.get(f"/api/messages/{msg.id}")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json['text'], "Message 0")
+        self.assertEqual(resp.json['username'], "author")
+        self.assertEqual(resp.json['likes_count'], 0)
+
+        resp = self.client.get("/api/messages/0")
+        self.assertEqual(resp.status_code, 404)
+
+    def test_followers(self):
+        """Are follower lists cut down to the requested fields?"""
+
+        self.login(self.reader_id)
+
+        resp = self.client.get(
+            f"/api/users/{self.author_id}/followers?fields=username")
+        self.assertEqual(resp.json, {'items': [{'username': "reader"}],
+                                     'next': None})
@@ -0,0 +1,64 @@
+"""Fragment cache tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_fragment_cache.py
+
+
+from unittest import TestCase
+
+from fragment_cache import FragmentCache
+
+
+class FragmentCacheTestCase(TestCase):
+    """Tests for the rendered message fragment cache."""
+
+    def test_render_once(self):
+        """Is a fragment rendered on the first lookup only?"""
+
+        cache = FragmentCache()
+        renders = []
+
+        def render():
+            renders.append(1)
+            return "<p>Hello</p>"
+
+        for _ in range(3):
+            self.assertEqual(cache.get_or_render((1, 'v1'), 1, 10, render), "<p>Hello</p>")
+
+        self.assertEqual(len(renders), 1)
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['bytes'], len("<p>Hello</p>"))
+
+    def test_memory_cap(self):
+        """Are the least recently used fragments evicted to stay under the cap?"""
+
+        cache = FragmentCache(max_bytes=10)
+        cache.get_or_render(1, 1, 10, lambda: "aaaa")
+        cache.get_or_render(2, 2, 10, lambda: "bbbb")
+        cache.get_or_render(1, 1, 10, lambda: "aaaa")
+        cache.get_or_render(3, 3, 10, lambda: "cccc")
+
+        stats = cache.stats()
+        self.assertEqual(stats['entries'], 2)
+        self.assertEqual(stats['bytes'], 8)
+        self.assertEqual(stats['evictions'], 1)
+
+        cache.get_or_render(1, 1, 10, lambda: "aaaa")
+        self.assertEqual(cache.stats()['hits'], 2)
+
+    def test_invalidate(self):
+        """Do message and author invalidation drop the right fragments?"""
+
+        cache = FragmentCache()
+        cache.get_or_render(1, 1, 10, lambda: "one")
+        cache.get_or_render(2, 2, 10, lambda: "two")
+        cache.get_or_render(3, 3, 20, lambda: "three")
+
+        cache.invalidate_message(1)
+        self.assertEqual(cache.stats()['entries'], 2)
+
+        cache.invalidate_author(10)
+        self.assertEqual(cache.stats()['entries'], 1)
+        self.assertEqual(cache.stats()['bytes'], len("three"))
@@ -0,0 +1,116 @@
+"""CSV generator tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_generator.py
+
+
+import csv
+import os
+import sys
+import tempfile
+from datetime import datetime
+from unittest import TestCase
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'generator'))
+
+from create_csvs import generate, split
+from profiles import PROFILES, follower_counts, zipf_rank
+
+NOW = datetime(2021, 10, 1)
+
+
+def read_rows(directory, kind):
+    with open(os.path.join(directory, f"{kind}.csv"), newline='') as f:
+        return list(csv.reader(f))[1:]
+
+
+class GeneratorTestCase(TestCase):
+    """Test generated CSVs on small datasets split into many shards."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def generate(self, name, **kwargs):
+        out = os.path.join(self.directory.name, name)
+        generate(out=out, users=50, messages=200, follows=600, seed=1,
+                 shard_rows=70, now=NOW, **kwargs)
+        return out
+
+    def assert_follows_valid(self, follows, num_users):
+        pairs = [(int(followed), int(follower)) for followed, follower in follows]
+
+        self.assertEqual(len(set(pairs)), len(pairs), "duplicate follows")
+        for followed, follower in pairs:
+            self.assertNotEqual(followed, follower)
+            self.assertTrue(1 <= followed <= num_users)
+            self.assertTrue(1 <= follower <= num_users)
+
+    def test_uniform(self):
+        """Are the exact row counts written, with distinct follows between
+        different, existing users?"""
+
+        out = self.generate('uniform', workers=2)
+
+        self.assertEqual(len(read_rows(out, 'users')), 50)
+        self.assertEqual(len(read_rows(out, 'messages')), 200)
+
+        follows = read_rows(out, 'follows')
+        self.assertEqual(len(follows), 600)
+        self.assert_follows_valid(follows, 50)
+
+    def test_skewed(self):
+        """Do skewed follows give each user their share, with no duplicates
+        or self-follows?"""
+
+        out = self.generate('celebrity', workers=2, profile='celebrity')
+
+        follows = read_rows(out, 'follows')
+        counts = follower_counts(PROFILES['celebrity'], 50, 600)
+        self.assertEqual(len(follows), sum(counts))
+        self.assert_follows_valid(follows, 50)
+
+        # Celebrities are followed by everyone else.
+        followers_of_1 = [row for row in follows if row[0] == '1']
+        self.assertEqual(len(followers_of_1), 49)
+
+    def test_workers_reproducible(self):
+        """Is the output the same however many worker processes made it?"""
+
+        for profile in ['uniform', 'celebrity']:
+            outs = [self.generate(f'{profile}-{workers}', workers=workers,
+                                  profile=profile)
+                    for workers in [1, 3]]
+
+            for kind in ['users', 'messages', 'follows']:
+                self.assertEqual(read_rows(outs[0], kind),
+                                 read_rows(outs[1], kind), kind)
+
+
+class ProfilesTestCase(TestCase):
+    """Test the skew math behind the dataset profiles."""
+
+    def test_split(self):
+        """Are rows split into near-equal shards that add up?"""
+
+        self.assertEqual(split(10, 3), [4, 3, 3])
+        self.assertEqual(sum(split(1001, 7)), 1001)
+
+    def test_zipf_rank(self):
+        """Are ranks always in 1..n, with low ranks the most likely?"""
+
+        for s in [1.0, 1.1, 0.5]:
+            ranks = [zipf_rank(i / 1000, 100, s) for i in range(1000)]
+            self.assertTrue(all(1 <= rank <= 100 for rank in ranks))
+            self.assertGreater(ranks.count(1), ranks.count(100))
+
+    def test_follower_counts(self):
+        """Does nobody get more followers than there are other users?"""
+
+        for name, profile in PROFILES.items():
+            counts = follower_counts(profile, 50, 2000)
+            self.assertEqual(len(counts), 50, name)
+            self.assertTrue(all(0 <= count <= 49 for count in counts), name)
@@ -0,0 +1,88 @@
+"""Message model tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_message_model.py
+
+
+import os
+from unittest import TestCase
+
+from models import db, User, Message
+from pagination import decode_cursor
+
+os.environ['DATABASE_URL'] = "postgresql:///warbler-test"
+
+from app import app
+
+db.create_all()
+
+
+class MessageModelTestCase(TestCase):
+    """Test the message model."""
+
+    def setUp(self):
+        """Create a user to post messages."""
+
+        User.query.delete()
+        Message.query.delete()
+
+        self.user = User(email="test@test.com", username="testuser",
+                         password="HASHED_PASSWORD")
+        db.session.add(self.user)
+        db.session.commit()
+
+    def post(self, text):
+        msg = Message(text=text, user_id=self.user.id)
+        db.session.add(msg)
+        db.session.commit()
+        return msg
+
+    def test_timestamp_set_on_insert(self):
+        """Does the database stamp each message when it's inserted?"""
+
+        first = self.post("First")
+        second = self.post("Second")
+
+        self.assertIsNotNone(first.timestamp)
+        self.assertGreater(second.timestamp, first.timestamp)
+
+    def test_timestamp_loaded_with_insert(self):
+        """Is the server-side timestamp available right after a flush?"""
+
+        msg = Message(text="Hello", user_id=self.user.id)
+        db.session.add(msg)
+        db.session.flush()
+
+        # Loaded by the INSERT's RETURNING, not left expired.
+        self.assertIn('timestamp', msg.__dict__)
+        db.session.rollback()
+
+    def test_order_within_transaction(self):
+        """Do messages inserted in one transaction, which share a timestamp,
+        still have a total order by id?"""
+
+        messages = [Message(text=f"Message {i}", user_id=self.user.id)
+                    for i in range(3)]
+        db.session.add_all(messages)
+        db.session.commit()
+
+        newest_first, _ = Message.for_user(self.user.id)
+        self.assertEqual([msg.text for msg in newest_first],
+                         ["Message 2", "Message 1", "Message 0"])
+
+    def test_pagination_within_transaction(self):
+        """Does the next page after one of messages sharing a timestamp
+        carry on from where it stopped?"""
+
+        db.session.add_all([Message(text=f"Message {i}", user_id=self.user.id)
+                            for i in range(3)])
+        db.session.commit()
+
+        page, cursor = Message.for_user(self.user.id, per_page=2)
+        self.assertEqual([msg.text for msg in page], ["Message 2", "Message 1"])
+
+        page, cursor = Message.for_user(self.user.id, before=decode_cursor(cursor),
+                                        per_page=2)
+        self.assertEqual([msg.text for msg in page], ["Message 0"])
+        self.assertIsNone(cursor)
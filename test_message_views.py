@@ -6,9 +6,12 @@
 
 
 import os
+from contextlib import contextmanager
 from unittest import TestCase
 
-from models import db, connect_db, Message, User
+from sqlalchemy import event
+
+from models import db, connect_db, Message, User, Follows, Likes, TimelineEntry
 
 # BEFORE we import our app, let's set an environmental variable
 # to use a different database for tests (we need to do this
@@ -20,7 +23,7 @@ os.environ['DATABASE_URL'] = "postgresql:///warbler-test"
 
 # Now we can import app
 
-from app import app, CURR_USER_KEY
+from app import app, CURR_USER_KEY, user_cache
 
 # Create our tables (we do this here, so we only create the tables
 # once for all tests --- in each test, we'll delete the data
@@ -33,6 +36,22 @@ db.create_all()
 app.config['WTF_CSRF_ENABLED'] = False
 
 
+@contextmanager
+def count_queries():
+    """Count the SQL statements run inside the block (in `counter[0]`)."""
+
+    counter = [0]
+
+    def before_cursor_execute(*args):
+        counter[0] += 1
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
 class MessageViewTestCase(TestCase):
     """Test views for messages."""
 
@@ -71,3 +90,142 @@ class MessageViewTestCase(TestCase):
 
             msg = Message.query.one()
             self.assertEqual(msg.text, "Hello")
+
+    def test_add_message_reaches_followers(self):
+        """Does a posted message show on its author's followers' homepages?"""
+
+        follower = User.signup(username="follower",
+                               email="follower@test.com",
+                               password="password",
+                               image_url=None)
+        db.session.commit()
+        db.session.add(Follows(user_being_followed_id=self.testuser.id,
+                               user_following_id=follower.id))
+        db.session.commit()
+        follower_id = follower.id
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testuser.id
+
+            for text in ("Hello", "Again"):
+                c.post("/messages/new", data={"text": text})
+
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = follower_id
+
+            resp = c.get("/")
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("Hello", str(resp.data))
+        self.assertIn("Again", str(resp.data))
+
+        messages, _ = TimelineEntry.for_user(follower_id)
+        self.assertEqual([msg.text for msg in messages], ["Again", "Hello"])
+
+    def post_as(self, user, count):
+        """Add `count` messages by `user`, fanned out to followers."""
+
+        for i in range(count):
+            msg = Message(text=f"Message {i}", user_id=user.id)
+            db.session.add(msg)
+            db.session.flush()
+            TimelineEntry.fan_out(msg)
+        db.session.commit()
+        return msg
+
+    def test_homepage_query_count(self):
+        """Does the homepage use the same number of queries however many
+        authors and messages it shows?"""
+
+        counts = []
+
+        for i, num_messages in enumerate([1, 10]):
+            author = User.signup(username=f"author{i}",
+                                 email=f"author{i}@test.com",
+                                 password="password",
+                                 image_url=None)
+            db.session.commit()
+            db.session.add(Follows(user_being_followed_id=author.id,
+                                   user_following_id=self.testuser.id))
+            db.session.commit()
+            self.post_as(author, num_messages)
+
+            user_cache.clear()
+            db.session.expire_all()
+
+            with self.client as c:
+                with c.session_transaction() as sess:
+                    sess[CURR_USER_KEY] = self.testuser.id
+
+                with count_queries() as queries:
+                    resp = c.get("/")
+
+            self.assertEqual(resp.status_code, 200)
+            counts.append(queries[0])
+
+        self.assertEqual(counts[0], counts[1])
+        # snapshot, timeline, authors, liked ids, full user row for the
+        # counters
+        self.assertEqual(counts[0], 5)
+
+    def test_message_show_query_count(self):
+        """Is a message shown with its author in a single query?"""
+
+        msg = self.post_as(self.testuser, 1)
+        msg_id = msg.id
+        db.session.expire_all()
+
+        with count_queries() as queries:
+            resp = self.client.get(f"/messages/{msg_id}")
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(queries[0], 1)
+
+    def test_like_and_unlike(self):
+        """Do liking and unliking keep the like counters in step?"""
+
+        author = User.signup(username="author",
+                             email="author@test.com",
+                             password="password",
+                             image_url=None)
+        db.session.commit()
+        msg_id = self.post_as(author, 1).id
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testuser.id
+
+            # liking twice only counts once
+            c.post(f"/users/add_like/{msg_id}")
+            resp = c.post(f"/users/add_like/{msg_id}")
+            self.assertEqual(resp.status_code, 302)
+
+            db.session.expire_all()
+            self.assertEqual(Message.query.get(msg_id).likes_count, 1)
+            self.assertEqual(User.query.get(self.testuser.id).likes_count, 1)
+            self.assertEqual(Likes.liked_ids(self.testuser.id, [msg_id]),
+                             {msg_id})
+
+            c.post(f"/users/remove_like/{msg_id}")
+            c.post(f"/users/remove_like/{msg_id}")
+
+            db.session.expire_all()
+            self.assertEqual(Message.query.get(msg_id).likes_count, 0)
+            self.assertEqual(User.query.get(self.testuser.id).likes_count, 0)
+            self.assertEqual(Likes.liked_ids(self.testuser.id, [msg_id]),
+                             set())
+
+    def test_like_own_message(self):
+        """Are users stopped from liking their own messages?"""
+
+        msg_id = self.post_as(self.testuser, 1).id
+
+        with self.client as c:
+            with c.session_transaction() as sess:
+                sess[CURR_USER_KEY] = self.testuser.id
+
+            resp = c.post(f"/users/add_like/{msg_id}")
+
+        self.assertEqual(resp.status_code, 403)
+        self.assertEqual(Likes.query.count(), 0)
@@ -0,0 +1,58 @@
+"""Schema migration tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_migrations.py
+
+
+import os
+import tempfile
+from unittest import TestCase
+
+from sqlalchemy import create_engine, inspect, select
+
+import migrations
+from models import db
+
+
+class MigrationsTestCase(TestCase):
+    """Test migrating a fresh database (SQLite, so no Postgres needed)."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.engine = create_engine(
+            'sqlite:///' + os.path.join(self.directory.name, 'warbler.db'))
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.directory.cleanup()
+
+    def applied(self):
+        with self.engine.connect() as conn:
+            return list(conn.execute(
+                select(migrations.schema_migrations.c.version)
+                .order_by(migrations.schema_migrations.c.version)).scalars())
+
+    def test_fresh_database(self):
+        """Does an empty database get the models' schema, with every
+        migration recorded and none run?"""
+
+        self.assertEqual(migrations.migrate(self.engine, progress=lambda *args: None), [])
+
+        inspector = inspect(self.engine)
+        self.assertTrue(set(db.metadata.tables) <= set(inspector.get_table_names()))
+        self.assertIn('ix_messages_user_id_timestamp',
+                      {index['name'] for index in inspector.get_indexes('messages')})
+        self.assertEqual(self.applied(),
+                         [migration.version for migration in migrations.MIGRATIONS])
+
+        # Nothing is pending the second time.
+        self.assertEqual(migrations.migrate(self.engine, progress=lambda *args: None), [])
+
+    def test_reset(self):
+        """Does reset leave an empty database?"""
+
+        migrations.migrate(self.engine, progress=lambda *args: None)
+        migrations.reset(self.engine)
+
+        self.assertEqual(inspect(self.engine).get_table_names(), [])
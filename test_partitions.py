@@ -0,0 +1,35 @@
+"""Message partitioning tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_partitions.py
+#
+# Converting, archiving and restoring need Postgres; these cover the
+# month arithmetic they're built on.
+
+
+from datetime import date
+from unittest import TestCase
+
+from partitions import PARTITION_NAME, add_months, partition_name
+
+
+class PartitionsTestCase(TestCase):
+    """Test partition months and names."""
+
+    def test_add_months(self):
+        """Does month arithmetic carry over year ends both ways?"""
+
+        self.assertEqual(add_months(date(2021, 10, 1), 3), date(2022, 1, 1))
+        self.assertEqual(add_months(date(2021, 1, 1), -1), date(2020, 12, 1))
+        self.assertEqual(add_months(date(2021, 12, 1), -24), date(2019, 12, 1))
+        self.assertEqual(add_months(date(2021, 5, 1), 0), date(2021, 5, 1))
+
+    def test_partition_name(self):
+        """Do partition names round-trip through PARTITION_NAME?"""
+
+        name = partition_name(date(2021, 3, 1))
+        self.assertEqual(name, "messages_p2021_03")
+
+        match = PARTITION_NAME.match(name)
+        self.assertEqual((match[1], match[2]), ("2021", "03"))
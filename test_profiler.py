@@ -0,0 +1,42 @@
+"""SQL profiler tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_profiler.py
+
+
+from unittest import TestCase
+
+from profiler import RequestProfile, fingerprint
+
+
+class ProfilerTestCase(TestCase):
+    """Tests for statement fingerprints and N+1 detection."""
+
+    def test_fingerprint_ignores_values(self):
+        """Do statements differing only in values share a fingerprint?"""
+
+        self.assertEqual(
+            fingerprint("SELECT * FROM users WHERE users.id = 1"),
+            fingerprint("SELECT *  FROM users\nWHERE users.id = 22"))
+
+        self.assertEqual(
+            fingerprint("SELECT * FROM users WHERE users.id IN (%(id_1_1)s)"),
+            fingerprint("SELECT * FROM users WHERE users.id IN (%(id_1_1)s, %(id_1_2)s)"))
+
+        self.assertNotEqual(
+            fingerprint("SELECT * FROM users"),
+            fingerprint("SELECT * FROM messages"))
+
+    def test_repeated(self):
+        """Are shapes run more than the threshold flagged?"""
+
+        profile = RequestProfile()
+        for user_id in range(12):
+            profile.record(f"SELECT * FROM users WHERE users.id = {user_id}", 0.001)
+        profile.record("SELECT * FROM messages", 0.002)
+
+        self.assertEqual(profile.query_count, 13)
+        self.assertAlmostEqual(profile.db_time, 0.014)
+        self.assertEqual(list(profile.repeated(10).values()), [12])
+        self.assertEqual(profile.repeated(12), {})
@@ -0,0 +1,79 @@
+"""Recommendation tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_recommendations.py
+
+
+from unittest import TestCase
+
+from recommendations import FollowGraph, blocks, top_suggestions
+
+
+def suggestions(graph, k, max_paths=1000):
+    """{user_id: [(suggested_id, score), ...]} best first."""
+
+    found = {}
+    for user_ids, suggested_ids, scores, ranks in top_suggestions(graph, k, max_paths):
+        for user_id, suggested_id, score, rank in zip(user_ids, suggested_ids, scores, ranks):
+            found.setdefault(int(user_id), []).append((int(rank), int(suggested_id), int(score)))
+    return {user_id: [(suggested_id, score) for _, suggested_id, score in sorted(rows)]
+            for user_id, rows in found.items()}
+
+
+class RecommendationsTestCase(TestCase):
+    """Test friends-of-friends suggestions on a small graph."""
+
+    def setUp(self):
+        # 1 follows 2 and 3; 2 and 3 both follow 4; 3 follows 5 and 1;
+        # 4 follows 1.
+        follows = [(1, 2), (1, 3), (2, 4), (3, 4), (3, 5), (3, 1), (4, 1)]
+        self.graph = FollowGraph.from_edges([f for f, _ in follows],
+                                            [t for _, t in follows])
+
+    def test_graph(self):
+        """Does the CSR graph hold every follow?"""
+
+        self.assertEqual(self.graph.num_follows, 7)
+        self.assertEqual(list(self.graph.matrix[3].indices), [1, 4, 5])
+
+    def test_friends_of_friends(self):
+        """Are candidates scored by mutual follows, excluding users already
+        followed and the user themself?"""
+
+        found = suggestions(self.graph, k=10)
+
+        self.assertEqual(found[1], [(4, 2), (5, 1)])
+        # 3 follows 1, who follows 2 (and 3 itself, which is dropped).
+        self.assertEqual(found[3], [(2, 1)])
+        self.assertEqual(found[4], [(2, 1), (3, 1)])
+
+    def test_self_follows_ignored(self):
+        """Are self-follows left out of the graph, so no score goes
+        negative?"""
+
+        follows = [(1, 1), (1, 2), (2, 1), (2, 3)]
+        graph = FollowGraph.from_edges([f for f, _ in follows],
+                                       [t for _, t in follows])
+
+        self.assertEqual(graph.num_follows, 3)
+        self.assertEqual(suggestions(graph, k=10)[1], [(3, 1)])
+
+    def test_top_k(self):
+        """Is each user cut down to their k best suggestions?"""
+
+        found = suggestions(self.graph, k=1)
+
+        self.assertEqual(found[1], [(4, 2)])
+        self.assertEqual(found[4], [(2, 1)])
+
+    def test_blocks(self):
+        """Do small path budgets still cover every user exactly once, and
+        give the same suggestions?"""
+
+        ranges = list(blocks(self.graph, max_paths=1))
+        covered = [user_id for start, stop in ranges for user_id in range(start, stop)]
+        self.assertEqual(covered, list(range(self.graph.matrix.shape[0])))
+
+        self.assertEqual(suggestions(self.graph, k=10, max_paths=1),
+                         suggestions(self.graph, k=10))
@@ -0,0 +1,108 @@
+"""Read-replica routing tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_replicas.py
+
+
+import os
+import tempfile
+from unittest import TestCase
+
+from flask import Flask, jsonify
+from sqlalchemy.exc import OperationalError
+
+from replicas import ReplicaRouter, RoutingSQLAlchemy
+
+
+def make_app(directory, replica_uris):
+    """A tiny app on its own primary SQLite database, with a table of notes
+    (each database gets a different note, so we can tell which was read)."""
+
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'test'
+    app.config['SQLALCHEMY_DATABASE_URI'] = (
+        'sqlite:///' + os.path.join(directory, 'primary.db'))
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_REPLICA_URIS'] = replica_uris
+
+    db = RoutingSQLAlchemy()
+    router = ReplicaRouter(db)
+
+    class Note(db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+        text = db.Column(db.Text)
+
+    @app.route('/notes', methods=['GET', 'POST'])
+    def notes():
+        return jsonify([note.text for note in Note.query.order_by(Note.id)])
+
+    router.init_app(app)
+    db.init_app(app)
+
+    with app.app_context():
+        for bind in [None, *app.config['SQLALCHEMY_BINDS']]:
+            engine = db.get_engine(bind=bind)
+            try:
+                Note.__table__.create(engine)
+            except OperationalError:
+                continue  # a replica the test makes unreachable
+            engine.execute(Note.__table__.insert(),
+                           text=bind or 'primary')
+
+    return app, router
+
+
+class ReplicaRouterTestCase(TestCase):
+    """Test routing of requests between primary and replicas."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.replica_uris = [
+            'sqlite:///' + os.path.join(self.directory.name, f'replica{i}.db')
+            for i in range(2)]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_reads_round_robin(self):
+        """Do GETs alternate between the replicas?"""
+
+        app, _ = make_app(self.directory.name, self.replica_uris)
+        client = app.test_client()
+
+        seen = [client.get('/notes').json[0] for _ in range(4)]
+        self.assertEqual(sorted(seen), ['replica0', 'replica0',
+                                        'replica1', 'replica1'])
+        self.assertNotEqual(seen[0], seen[1])
+
+    def test_pinned_after_write(self):
+        """Does a client read from the primary right after a POST?"""
+
+        app, router = make_app(self.directory.name, self.replica_uris)
+        client = app.test_client()
+
+        client.post('/notes')
+        self.assertEqual(client.get('/notes').json, ['primary'])
+
+        router.pin_seconds = 0
+        client.post('/notes')
+        self.assertNotEqual(client.get('/notes').json, ['primary'])
+
+    def test_unhealthy_replica_skipped(self):
+        """Are replicas that fail the health check left out?"""
+
+        app, _ = make_app(self.directory.name,
+                          [self.replica_uris[0],
+                           'sqlite:////nonexistent/dir/replica.db'])
+        client = app.test_client()
+
+        seen = {client.get('/notes').json[0] for _ in range(4)}
+        self.assertEqual(seen, {'replica0'})
+
+    def test_no_replicas(self):
+        """Without replicas, does everything use the primary?"""
+
+        app, _ = make_app(self.directory.name, [])
+
+        self.assertEqual(app.test_client().get('/notes').json, ['primary'])
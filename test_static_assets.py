@@ -0,0 +1,131 @@
+"""Fingerprinted static asset tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_static_assets.py
+
+
+import gzip
+import os
+import tempfile
+from unittest import TestCase, skipUnless
+
+from flask import Flask, render_template_string
+
+from static_assets import StaticAssets, build, brotli
+
+CSS = b'body { background: url("/static/images/bg.png"); } ' * 20
+
+
+def write(directory, name, data):
+    path = os.path.join(directory, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+class StaticAssetsTestCase(TestCase):
+    """Test building and serving fingerprinted static files."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.static_dir = os.path.join(self.directory.name, 'static')
+        self.assets_dir = os.path.join(self.directory.name, 'assets')
+
+        write(self.static_dir, 'stylesheets/style.css', CSS)
+        write(self.static_dir, 'images/bg.png', b'\x89PNG not really')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def make_app(self):
+        app = Flask(__name__, static_folder=self.static_dir)
+        app.config['ASSETS_DIR'] = self.assets_dir
+        return app, StaticAssets(app)
+
+    def test_build(self):
+        """Are files copied under content-hashed names, with stylesheets
+        pointing at the other files' new names?"""
+
+        files = build(self.static_dir, self.assets_dir)
+
+        image = files['images/bg.png']['path']
+        self.assertRegex(image, r'^images/bg\.[0-9a-f]{12}\.png$')
+        self.assertEqual(files['images/bg.png']['encodings'], [])
+
+        with open(os.path.join(self.assets_dir, files['stylesheets/style.css']['path']), 'rb') as f:
+            css = f.read()
+        self.assertIn(f'url("../{image}")'.encode(), css)
+        self.assertNotIn(b'/static/', css)
+
+        # Same contents, same names.
+        self.assertEqual(build(self.static_dir, self.assets_dir), files)
+
+    def test_url_for(self):
+        """Do templates get fingerprinted URLs once there's a build?"""
+
+        template = "{{ url_for('static', filename='images/bg.png') }}"
+
+        app, _ = self.make_app()
+        with app.test_request_context():
+            self.assertEqual(render_template_string(template),
+                             '/static/images/bg.png')
+
+        files = build(self.static_dir, self.assets_dir)
+        app, _ = self.make_app()
+        with app.test_request_context():
+            self.assertEqual(render_template_string(template),
+                             '/assets/' + files['images/bg.png']['path'])
+
+    def test_send_gzip(self):
+        """Is the gzip variant sent to clients accepting it, with headers
+        to cache it for good?"""
+
+        files = build(self.static_dir, self.assets_dir)
+        app, _ = self.make_app()
+        client = app.test_client()
+        url = '/assets/' + files['stylesheets/style.css']['path']
+
+        resp = client.get(url, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.content_encoding, 'gzip')
+        self.assertEqual(resp.mimetype, 'text/css')
+        self.assertEqual(gzip.decompress(resp.data), CSS.replace(
+            b'/static/images/bg.png',
+            ('../' + files['images/bg.png']['path']).encode()))
+        self.assertIn('immutable', resp.headers['Cache-Control'])
+        self.assertIn('max-age=31536000', resp.headers['Cache-Control'])
+        self.assertIn('Accept-Encoding', resp.headers['Vary'])
+
+        resp = client.get(url)
+        self.assertIsNone(resp.content_encoding)
+        self.assertTrue(resp.data.startswith(b'body'))
+
+        self.assertEqual(client.get('/assets/stylesheets/style.css').status_code, 404)
+
+    def test_send_previous_build(self):
+        """Are an earlier build's files still served after a rebuild?"""
+
+        old = build(self.static_dir, self.assets_dir)
+        write(self.static_dir, 'stylesheets/style.css', CSS + b'p { margin: 0; }')
+        new = build(self.static_dir, self.assets_dir)
+
+        old_path = old['stylesheets/style.css']['path']
+        self.assertNotEqual(old_path, new['stylesheets/style.css']['path'])
+
+        app, _ = self.make_app()
+        resp = app.test_client().get('/assets/' + old_path,
+                                     headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.content_encoding, 'gzip')
+
+    @skipUnless(brotli, "brotli isn't installed")
+    def test_send_brotli(self):
+        """Is brotli preferred when the client accepts it?"""
+
+        files = build(self.static_dir, self.assets_dir)
+        app, _ = self.make_app()
+        url = '/assets/' + files['stylesheets/style.css']['path']
+
+        resp = app.test_client().get(url, headers={'Accept-Encoding': 'gzip, br'})
+        self.assertEqual(resp.content_encoding, 'br')
@@ -0,0 +1,165 @@
+"""Timeline model tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_timeline_model.py
+
+
+import os
+from unittest import TestCase
+from unittest.mock import patch
+
+from models import db, User, Message, Follows, Likes, TimelineEntry
+from pagination import decode_cursor
+
+os.environ['DATABASE_URL'] = "postgresql:///warbler-test"
+
+from app import app
+
+db.create_all()
+
+
+class TimelineModelTestCase(TestCase):
+    """Tests for the fan-out home timelines."""
+
+    def setUp(self):
+        """Create two users where `follower` follows `author`."""
+
+        TimelineEntry.query.delete()
+        Likes.query.delete()
+        Follows.query.delete()
+        Message.query.delete()
+        User.query.delete()
+
+        self.author = User(email="author@test.com", username="author",
+                           password="HASHED_PASSWORD")
+        self.follower = User(email="follower@test.com", username="follower",
+                             password="HASHED_PASSWORD")
+        db.session.add_all([self.author, self.follower])
+        db.session.commit()
+
+        db.session.add(Follows(user_being_followed_id=self.author.id,
+                               user_following_id=self.follower.id))
+        db.session.commit()
+
+    def post(self, user, text):
+        """Add a message the way the messages_add route does."""
+
+        msg = Message(text=text, user_id=user.id)
+        db.session.add(msg)
+        db.session.flush()
+        TimelineEntry.fan_out(msg)
+        db.session.commit()
+        return msg
+
+    def timeline(self, user):
+        """First page of `user`'s home timeline."""
+
+        messages, next_cursor = TimelineEntry.for_user(user.id)
+        return messages
+
+    def test_fan_out(self):
+        """Does a new message reach the author and their followers?"""
+
+        msg = self.post(self.author, "Hello")
+
+        self.assertEqual(self.timeline(self.author), [msg])
+        self.assertEqual(self.timeline(self.follower), [msg])
+
+    def test_fan_out_not_followed(self):
+        """Do messages stay out of timelines of users who don't follow?"""
+
+        self.post(self.follower, "Hello")
+
+        self.assertEqual(self.timeline(self.author), [])
+
+    def test_prune_and_backfill(self):
+        """Does unfollowing remove messages and following restore them?"""
+
+        msg = self.post(self.author, "Hello")
+
+        TimelineEntry.prune(self.follower.id, [self.author.id])
+        db.session.commit()
+        self.assertEqual(self.timeline(self.follower), [])
+
+        TimelineEntry.backfill(self.follower.id, [self.author.id])
+        db.session.commit()
+        self.assertEqual(self.timeline(self.follower), [msg])
+
+    def test_rebuild(self):
+        """Does rebuild recreate timelines from messages and follows?"""
+
+        msg = Message(text="Bulk loaded", user_id=self.author.id)
+        db.session.add(msg)
+        db.session.commit()
+
+        TimelineEntry.rebuild()
+        db.session.commit()
+
+        self.assertEqual(self.timeline(self.author), [msg])
+        self.assertEqual(self.timeline(self.follower), [msg])
+
+    def test_pagination(self):
+        """Do cursors walk the timeline one page at a time, newest first?"""
+
+        first, second, third = [self.post(self.author, text)
+                                for text in ("One", "Two", "Three")]
+
+        page, cursor = TimelineEntry.for_user(self.follower.id, per_page=2)
+        self.assertEqual(page, [third, second])
+        self.assertIsNotNone(cursor)
+
+        page, cursor = TimelineEntry.for_user(
+            self.follower.id, before=decode_cursor(cursor), per_page=2)
+        self.assertEqual(page, [first])
+        self.assertIsNone(cursor)
+
+    def test_pagination_same_timestamp(self):
+        """Do cursors page through messages posted at the same moment?"""
+
+        # Posted in one transaction, so the database gives them one time.
+        messages = [Message(text=text, user_id=self.author.id)
+                    for text in ("One", "Two", "Three")]
+        for msg in messages:
+            db.session.add(msg)
+            db.session.flush()
+            TimelineEntry.fan_out(msg)
+        db.session.commit()
+
+        seen = []
+        cursor = None
+        for _ in range(3):
+            page, cursor = TimelineEntry.for_user(
+                self.follower.id, before=decode_cursor(cursor), per_page=2)
+            seen.extend(msg.text for msg in page)
+            if not cursor:
+                break
+
+        self.assertEqual(seen, ["Three", "Two", "One"])
+
+    def test_delete_references(self):
+        """Are a message's likes and timeline entries deleted with it, even
+        without foreign keys to cascade them?"""
+
+        msg = self.post(self.author, "Hello")
+        Likes.add(self.follower.id, msg.id)
+        db.session.commit()
+
+        Message.delete_references([msg.id])
+        db.session.delete(msg)
+        db.session.commit()
+
+        self.assertEqual(TimelineEntry.query.count(), 0)
+        self.assertEqual(Likes.query.count(), 0)
+
+    def test_trim_all(self):
+        """Does trimming keep just the newest entries of each timeline?"""
+
+        first, second, third = [self.post(self.author, text)
+                                for text in ("One", "Two", "Three")]
+
+        with patch('models.TIMELINE_LENGTH', 2):
+            TimelineEntry.trim_all(batch_users=1)
+
+        self.assertEqual(self.timeline(self.author), [third, second])
+        self.assertEqual(self.timeline(self.follower), [third, second])
@@ -0,0 +1,70 @@
+"""User cache tests."""
+
+# run these tests like:
+#
+#    python -m unittest test_user_cache.py
+
+
+from unittest import TestCase
+
+from user_cache import UserCache, UserSnapshot
+
+
+def fake_loader(user_id):
+    """Snapshot for any positive id, None otherwise."""
+
+    if user_id > 0:
+        return UserSnapshot(user_id, f"user{user_id}", None, None, None, None, None)
+    return None
+
+
+class UserCacheTestCase(TestCase):
+    """Tests for the logged-in user cache."""
+
+    def test_hits_and_misses(self):
+        """Is a snapshot loaded once and then served from the cache?"""
+
+        cache = UserCache(maxsize=10, ttl=60, loader=fake_loader)
+
+        self.assertEqual(cache.get(1).username, "user1")
+        self.assertEqual(cache.get(1).username, "user1")
+
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hit_ratio'], 0.5)
+
+    def test_missing_user_not_cached(self):
+        """Are lookups of unknown users retried rather than cached?"""
+
+        cache = UserCache(loader=fake_loader)
+
+        self.assertIsNone(cache.get(-1))
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_lru_eviction(self):
+        """Is the least recently used user evicted when full?"""
+
+        cache = UserCache(maxsize=2, loader=fake_loader)
+        cache.get(1)
+        cache.get(2)
+        cache.get(1)
+        cache.get(3)
+
+        cache.get(1)
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertEqual(cache.stats()['hits'], 2)
+
+    def test_ttl_and_invalidate(self):
+        """Do expired and invalidated entries get reloaded?"""
+
+        cache = UserCache(ttl=0, loader=fake_loader)
+        cache.get(1)
+        cache.get(1)
+        self.assertEqual(cache.stats()['misses'], 2)
+
+        cache = UserCache(ttl=60, loader=fake_loader)
+        cache.get(1)
+        cache.invalidate(1)
+        cache.get(1)
+        self.assertEqual(cache.stats()['misses'], 2)
@@ -8,7 +8,7 @@
 import os
 from unittest import TestCase
 
-from models import db, User, Message, Follows
+from models import db, User, Message, Follows, FollowState
 
 # BEFORE we import our app, let's set an environmental variable
 # to use a different database for tests (we need to do this
@@ -55,4 +55,101 @@ class UserModelTestCase(TestCase):
 
         # User should have no messages & no followers
         self.assertEqual(len(u.messages), 0)
-        self.assertEqual(len(u.followers), 0)
\ No newline at end of file
+        self.assertEqual(len(u.followers), 0)
+
+    def test_counters(self):
+        """Do bump and reconcile_counts keep the denormalized counters right?"""
+
+        u1 = User(email="u1@test.com", username="u1", password="HASHED_PASSWORD")
+        u2 = User(email="u2@test.com", username="u2", password="HASHED_PASSWORD")
+        db.session.add_all([u1, u2])
+        db.session.commit()
+
+        db.session.add(Follows(user_being_followed_id=u1.id, user_following_id=u2.id))
+        db.session.add(Message(text="Hello", user_id=u1.id))
+        User.bump(User.followers_count, [u1.id], 5)
+        db.session.commit()
+        self.assertEqual(u1.followers_count, 5)
+
+        User.reconcile_counts()
+        db.session.commit()
+
+        self.assertEqual(u1.messages_count, 1)
+        self.assertEqual(u1.followers_count, 1)
+        self.assertEqual(u1.following_count, 0)
+        self.assertEqual(u2.following_count, 1)
+
+    def test_follow_state(self):
+        """Do is_following/is_followed_by and FollowState agree with follows?"""
+
+        u1 = User(email="u1@test.com", username="u1", password="HASHED_PASSWORD")
+        u2 = User(email="u2@test.com", username="u2", password="HASHED_PASSWORD")
+        u3 = User(email="u3@test.com", username="u3", password="HASHED_PASSWORD")
+        db.session.add_all([u1, u2, u3])
+        db.session.commit()
+
+        db.session.add(Follows(user_being_followed_id=u2.id, user_following_id=u1.id))
+        db.session.add(Follows(user_being_followed_id=u1.id, user_following_id=u3.id))
+        db.session.commit()
+
+        self.assertTrue(u1.is_following(u2))
+        self.assertFalse(u2.is_following(u1))
+        self.assertTrue(u2.is_followed_by(u1))
+        self.assertTrue(u1.is_followed_by(u3))
+
+        state = FollowState(u1.id, [u2.id, u3.id])
+        self.assertTrue(state.is_following(u2))
+        self.assertFalse(state.is_following(u3))
+        self.assertTrue(state.is_followed_by(u3))
+        self.assertFalse(state.is_followed_by(u2))
+
+    def test_follow_cards(self):
+        """Do follower/following cards page through follows in id order?"""
+
+        star = User(email="star@test.com", username="star", password="HASHED_PASSWORD")
+        fans = [User(email=f"fan{i}@test.com", username=f"fan{i}",
+                     password="HASHED_PASSWORD")
+                for i in range(5)]
+        db.session.add_all([star, *fans])
+        db.session.commit()
+
+        for fan in fans:
+            db.session.add(Follows(user_being_followed_id=star.id,
+                                   user_following_id=fan.id))
+        db.session.commit()
+
+        fan_ids = sorted(fan.id for fan in fans)
+
+        cards, has_more = User.follower_cards(star.id, per_page=3)
+        self.assertEqual([card.id for card in cards], fan_ids[:3])
+        self.assertTrue(has_more)
+        usernames = {fan.id: fan.username for fan in fans}
+        self.assertEqual(cards[0].username, usernames[fan_ids[0]])
+
+        cards, has_more = User.follower_cards(star.id, after=cards[-1].id,
+                                              per_page=3)
+        self.assertEqual([card.id for card in cards], fan_ids[3:])
+        self.assertFalse(has_more)
+
+        cards, has_more = User.following_cards(fans[0].id)
+        self.assertEqual([card.id for card in cards], [star.id])
+        self.assertFalse(has_more)
+
+    def test_search(self):
+        """Does search match substrings, rank prefixes first and paginate?"""
+
+        for username in ["bob_smith", "jimbob", "alice", "bobby"]:
+            db.session.add(User(email=f"{username}@test.com", username=username,
+                                password="HASHED_PASSWORD"))
+        db.session.commit()
+
+        users, has_more = User.search("bob")
+        self.assertEqual([u.username for u in users], ["bob_smith", "bobby", "jimbob"])
+        self.assertFalse(has_more)
+
+        users, has_more = User.search("bo", per_page=1)
+        self.assertEqual([u.username for u in users], ["bob_smith"])
+        self.assertTrue(has_more)
+
+        users, has_more = User.search("o_b")
+        self.assertEqual(users, [])
@@ -0,0 +1,142 @@
+"""Cache of the logged-in user for Warbler requests.
+
+Nearly every page only needs the current user's id, username and images
+(for the navbar), so `g.user` is a `LazyUser` that answers those from a
+small cross-request cache of immutable snapshots and only loads the full
+`User` row when something else (counters, relationships, writes) is used.
+"""
+
+from collections import OrderedDict, namedtuple
+from threading import Lock
+from time import monotonic
+
+from models import db, User
+
+UserSnapshot = namedtuple('UserSnapshot', [
+    'id',
+    'username',
+    'email',
+    'image_url',
+    'header_image_url',
+    'bio',
+    'location',
+])
+
+
+def load_snapshot(user_id):
+    """Read just the snapshot columns for `user_id`; None if no such user."""
+
+    row = (db.session
+           .query(*[getattr(User, field) for field in UserSnapshot._fields])
+           .filter(User.id == user_id)
+           .first())
+
+    return UserSnapshot(*row) if row else None
+
+
+class UserCache:
+    """Thread-safe LRU cache of UserSnapshots whose entries expire after
+    `ttl` seconds."""
+
+    def __init__(self, maxsize=1024, ttl=60, loader=load_snapshot):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.loader = loader
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id):
+        """Snapshot for `user_id`, loading it on a miss."""
+
+        now = monotonic()
+
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        snapshot = self.loader(user_id)
+
+        # Missing users aren't cached, so a new signup is seen at once.
+        if snapshot is not None:
+            with self._lock:
+                self._entries[user_id] = (now + self.ttl, snapshot)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+
+        return snapshot
+
+    def invalidate(self, user_id):
+        """Forget `user_id`, e.g. after their profile changes."""
+
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        """Forget everything."""
+
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Hit/miss counts and current size, for sizing the cache."""
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / lookups if lookups else None,
+            }
+
+
+class LazyUser:
+    """Stand-in for the logged-in `User` on `g`.
+
+    Snapshot fields come from `cache` without touching the database; any
+    other attribute loads the real `User` (available as `.model`) on first
+    use. Falsy if the user no longer exists, like a missing `g.user`.
+    """
+
+    def __init__(self, user_id, cache):
+        self.id = user_id
+        self._cache = cache
+        self._snapshot = None
+        self._model = None
+
+    @property
+    def snapshot(self):
+        if self._snapshot is None:
+            self._snapshot = self._cache.get(self.id)
+        return self._snapshot
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = User.query.get(self.id)
+        return self._model
+
+    def __bool__(self):
+        if self._model is not None:
+            return True
+        return self.snapshot is not None
+
+    def __getattr__(self, name):
+        if name in UserSnapshot._fields and self._model is None:
+            return getattr(self.snapshot, name)
+        return getattr(self.model, name)
+
+    def __repr__(self):
+        return f"<LazyUser #{self.id}>"